@@ -1,10 +1,17 @@
 print("Initializing Flowscale LLM Nodes")
 
-from .nodes.llm.openai import OpenAIAPI
+from .nodes.common.env import load_environment
+
+load_environment()
+
+# Node modules only import light dependencies at load time; openai, astrapy,
+# LangChain and PyPDF2 are imported when a node first executes.
+from .nodes.llm.openai import OpenAIAPI, OpenAIBatchAPI
+from .nodes.llm.openai_batch_job import OpenAIBatchJob
 from .nodes.llm.openai_node_input import OpenAIAPIWithAPIKey
-from .nodes.llm.brand_voice import OpenAIBrandVoiceReformatter
+from .nodes.llm.brand_voice import OpenAIBrandVoiceReformatter, OpenAIBrandVoiceBatchReformatter
 from .nodes.llm.ollama import OllamaAPI
-from .nodes.embedding.openai import OpenAIEmbedding
+from .nodes.embedding.openai import OpenAIEmbedding, OpenAIEmbeddingBatchJob
 from .nodes.vectordb.astradb import AstraDBStoreEmbeddingsNode
 from .nodes.vectordb import AstraOpenAISearchNode, AstraOpenAIIngestNode
 
@@ -12,12 +19,20 @@ from .utilitynodes.fileloader import FileLoaderNode
 from .utilitynodes.json_extracter import ExtractPropertyNode
 from .utilitynodes.webhook import WebhookSender
 
+from .nodes.common.metrics import register_metrics_route
+
+register_metrics_route()
+
 NODE_CLASS_MAPPINGS = {
   "openai": OpenAIAPI,
+  "openai_batch": OpenAIBatchAPI,
+  "openai_batch_job": OpenAIBatchJob,
   "openai_with_api_key": OpenAIAPIWithAPIKey,
   "openai_brand_voice_reformatter": OpenAIBrandVoiceReformatter,
+  "openai_brand_voice_batch_reformatter": OpenAIBrandVoiceBatchReformatter,
   "llm_generate": OllamaAPI,
   "openai_embedding": OpenAIEmbedding,
+  "openai_embedding_batch_job": OpenAIEmbeddingBatchJob,
   "astradb_store_embeddings": AstraDBStoreEmbeddingsNode,
   "astradb_search": AstraOpenAISearchNode,
   "astradb_ingest": AstraOpenAIIngestNode,
@@ -29,10 +44,14 @@ NODE_CLASS_MAPPINGS = {
 
 NODE_DISPLAY_NAME_MAPPINGS = {
   "openai": "[FS] OpenAI",
+  "openai_batch": "[FS] OpenAI Batch",
+  "openai_batch_job": "[FS] OpenAI Batch Job (offline)",
   "openai_with_api_key": "[FS] OpenAI (with API Key)",
   "openai_brand_voice_reformatter": "[FS] OpenAI Brand Voice Reformatter",
+  "openai_brand_voice_batch_reformatter": "[FS] OpenAI Brand Voice Batch Reformatter",
   "llm_generate": "[FS] LLM Generate",
   "openai_embedding": "[FS] OpenAI Embedding",
+  "openai_embedding_batch_job": "[FS] OpenAI Embedding Batch Job (offline)",
   "astradb_store_embeddings": "[FS] AstraDB Store Embeddings",
   "astradb_search": "[FS] AstraDB Search",
   "astradb_ingest": "[FS] AstraDB Ingest",
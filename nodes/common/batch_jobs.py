@@ -0,0 +1,211 @@
+"""
+Offline jobs through the OpenAI Batch API.
+
+Requests are written as a JSONL file, uploaded with purpose="batch" and
+submitted as a batch, which is then polled with exponential backoff.
+Job state is persisted under `<cache dir>/batches/<job key>.json`, where
+the job key hashes the account (API key and base URL), the endpoint and
+every request body. Re-running a node
+with the same inputs therefore resumes the in-flight batch (also after a
+ComfyUI restart) instead of submitting and paying for it again.
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+from .openai_client import account_id
+from .response_cache import CACHE_DIR, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+BATCH_STATE_DIR = os.environ.get("FLOWSCALE_OPENAI_BATCH_DIR", os.path.join(CACHE_DIR, "batches"))
+
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+RESUBMIT_STATUSES = ("failed", "expired", "cancelled")
+
+_state_lock = threading.Lock()
+
+
+def batch_job_key(endpoint: str, bodies: list, account: str = "") -> str:
+    return make_cache_key("openai.batch", account=account, endpoint=endpoint, bodies=bodies)
+
+
+def _state_path(job_key: str) -> str:
+    return os.path.join(BATCH_STATE_DIR, f"{job_key}.json")
+
+
+def _results_path(job_key: str) -> str:
+    return os.path.join(BATCH_STATE_DIR, f"{job_key}.results.json")
+
+
+def load_state(job_key: str):
+    try:
+        with open(_state_path(job_key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_state(state: dict):
+    os.makedirs(BATCH_STATE_DIR, exist_ok=True)
+    path = _state_path(state["job_key"])
+    # Write-then-rename so a crash never leaves a half-written state file
+    with _state_lock:
+        fd, tmp_path = tempfile.mkstemp(dir=BATCH_STATE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+
+def list_pending_jobs():
+    """
+    Returns the saved state of every batch that has not reached a terminal
+    status, e.g. to report in-flight work after a restart.
+    """
+    if not os.path.isdir(BATCH_STATE_DIR):
+        return []
+    pending = []
+    for name in os.listdir(BATCH_STATE_DIR):
+        if name.endswith(".json") and not name.endswith(".results.json"):
+            state = load_state(name[: -len(".json")])
+            if state and state.get("status") not in TERMINAL_STATUSES:
+                pending.append(state)
+    return pending
+
+
+def submit_or_resume(client, endpoint: str, bodies: list, completion_window: str = "24h") -> dict:
+    """
+    Returns the persisted state for this exact set of requests, submitting a
+    new batch only if none exists or the previous one can no longer finish.
+    """
+    # Batches belong to an account, so a job is only resumed under the same one
+    job_key = batch_job_key(endpoint, bodies, account_id(client))
+    state = load_state(job_key)
+    if state and state.get("status") not in RESUBMIT_STATUSES:
+        logger.info(f"Resuming OpenAI batch {state['batch_id']} ({state['status']})")
+        return state
+
+    fd, input_path = tempfile.mkstemp(suffix=".jsonl")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for index, body in enumerate(bodies):
+                f.write(json.dumps({
+                    "custom_id": f"request-{index}",
+                    "method": "POST",
+                    "url": endpoint,
+                    "body": body,
+                }))
+                f.write("\n")
+
+        with open(input_path, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+    finally:
+        os.remove(input_path)
+
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=endpoint,
+        completion_window=completion_window,
+    )
+    logger.info(f"Submitted OpenAI batch {batch.id} with {len(bodies)} requests")
+
+    state = {
+        "job_key": job_key,
+        "batch_id": batch.id,
+        "endpoint": endpoint,
+        "input_file_id": input_file.id,
+        "count": len(bodies),
+        "status": batch.status,
+        "output_file_id": None,
+        "error_file_id": None,
+        "submitted_at": time.time(),
+    }
+    save_state(state)
+    return state
+
+
+def refresh_state(client, state: dict) -> dict:
+    batch = client.batches.retrieve(state["batch_id"])
+    state["status"] = batch.status
+    state["output_file_id"] = batch.output_file_id
+    state["error_file_id"] = batch.error_file_id
+    if batch.request_counts is not None:
+        state["request_counts"] = {
+            "total": batch.request_counts.total,
+            "completed": batch.request_counts.completed,
+            "failed": batch.request_counts.failed,
+        }
+    save_state(state)
+    return state
+
+
+def wait_for_batch(client, state: dict, max_wait: float, poll_interval: float = 5.0, max_poll_interval: float = 60.0) -> dict:
+    """
+    Polls until the batch reaches a terminal status or `max_wait` seconds
+    pass. The delay between polls grows by 1.5x up to `max_poll_interval`.
+    """
+    deadline = time.monotonic() + max_wait
+    delay = poll_interval
+    while True:
+        state = refresh_state(client, state)
+        if state["status"] in TERMINAL_STATUSES:
+            return state
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return state
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 1.5, max_poll_interval)
+
+
+def _read_jsonl_file(client, file_id):
+    if not file_id:
+        return []
+    content = client.files.content(file_id).text
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def collect_results(client, state: dict) -> list:
+    """
+    Maps a completed batch's output back to input order. Each entry is
+    {"body": <response body>, "error": None} or {"body": None, "error": str}.
+    Results are saved next to the job state so later runs skip the download.
+    """
+    try:
+        with open(_results_path(state["job_key"]), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+
+    results = [{"body": None, "error": "No result returned for request"} for _ in range(state["count"])]
+
+    for line in _read_jsonl_file(client, state.get("output_file_id")) + _read_jsonl_file(client, state.get("error_file_id")):
+        index = int(line["custom_id"].rsplit("-", 1)[1])
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code", 200) >= 400:
+            error = line.get("error") or response.get("body", {}).get("error")
+            results[index] = {"body": None, "error": f"Error during API call: {error}"}
+        else:
+            results[index] = {"body": response.get("body"), "error": None}
+
+    os.makedirs(BATCH_STATE_DIR, exist_ok=True)
+    with open(_results_path(state["job_key"]), "w", encoding="utf-8") as f:
+        json.dump(results, f)
+    return results
+
+
+def run_batch_job(client, endpoint: str, bodies: list, max_wait: float, poll_interval: float = 5.0):
+    """
+    Submits (or resumes) a batch and waits up to `max_wait` seconds for it.
+    Returns (state, results) where results is None until the batch completes.
+    """
+    state = submit_or_resume(client, endpoint, bodies)
+    if state["status"] != "completed":
+        state = wait_for_batch(client, state, max_wait, poll_interval)
+    if state["status"] != "completed":
+        return state, None
+    return state, collect_results(client, state)
@@ -0,0 +1,45 @@
+"""
+Response-cache keys and change detection shared by the OpenAI chat nodes.
+"""
+
+from .response_cache import make_cache_key
+
+
+def openai_chat_cache_key(model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, overflow_strategy="truncate", auto_max_tokens=False, account=""):
+    """
+    `account` is `openai_client.account_id(client)`, so a completion cached
+    for one API key or base URL is never served to another.
+    """
+    return make_cache_key(
+        "openai.chat",
+        account=account,
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        response_format=response_format,
+        temperature=temperature,
+        top_p=top_p,
+        max_completion_tokens=max_completion_tokens,
+        presence_penalty=presence_penalty,
+        frequency_penalty=frequency_penalty,
+        overflow_strategy=overflow_strategy,
+        auto_max_tokens=auto_max_tokens,
+    )
+
+
+class OpenAIChatCaching:
+    """
+    Mixin for chat nodes taking the standard OpenAI sampling inputs.
+    IS_CHANGED hashes the inputs that determine the completion, so ComfyUI
+    re-runs the node only when one of them changes, whether or not the
+    response cache is used. The response cache key also includes the
+    account, which is only known once the client is built.
+    """
+
+    _cache_key = staticmethod(openai_chat_cache_key)
+
+    @classmethod
+    def IS_CHANGED(s, model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, use_cache=False, overflow_strategy="truncate", auto_max_tokens=False, **kwargs):
+        return openai_chat_cache_key(model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, overflow_strategy, auto_max_tokens)
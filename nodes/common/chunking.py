@@ -0,0 +1,124 @@
+"""
+Token-aware recursive text chunking.
+
+Text is split on paragraphs and sentences before anything is tokenized.
+A paragraph whose sentences fit the token budget together stays one unit;
+otherwise its sentences are the units, and a sentence that still does not
+fit is split into words (and a single over-long word into pieces of
+`chunk_tokens` tokens, cut between token ids). The units are then packed
+greedily so every chunk comes as close to `chunk_tokens` as possible, with
+up to `overlap_tokens` of trailing units repeated at the start of the next
+chunk. Every sentence is tokenized once (only the words of an over-budget
+sentence a second time), so the whole pass is linear in the length of the
+text. Empty and duplicate chunks are dropped; duplicates are detected by
+hash, so memory does not grow with the emitted text.
+"""
+
+import re
+import hashlib
+from collections import deque
+from typing import Iterator
+
+from .tokens import count_tokens, split_to_tokens
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_WORD_BREAK = re.compile(r"\s+")
+
+
+def _units(text: str, chunk_tokens: int, model: str) -> Iterator[tuple]:
+    """
+    Yields (separator, text, tokens) units no larger than `chunk_tokens`,
+    where separator is what joins the unit to the one before it.
+    """
+
+    def split_words(sentence, separator):
+        first = True
+        for word in _WORD_BREAK.split(sentence):
+            if not word:
+                continue
+            tokens = count_tokens(word, model)
+            if tokens <= chunk_tokens:
+                yield (separator if first else " "), word, tokens
+            else:
+                # A single "word" longer than the budget: cut it by token ids
+                for index, (part, part_tokens) in enumerate(split_to_tokens(word, chunk_tokens, model)):
+                    yield (separator if first and index == 0 else ""), part, part_tokens
+            first = False
+
+    first_paragraph = True
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        separator = "" if first_paragraph else "\n\n"
+        first_paragraph = False
+
+        sentences = [sentence for sentence in _SENTENCE_BREAK.split(paragraph) if sentence.strip()]
+        counts = [count_tokens(sentence, model) for sentence in sentences]
+        if sum(counts) <= chunk_tokens:
+            yield separator, paragraph, sum(counts)
+            continue
+
+        for index, (sentence, tokens) in enumerate(zip(sentences, counts)):
+            sentence_separator = separator if index == 0 else " "
+            if tokens <= chunk_tokens:
+                yield sentence_separator, sentence, tokens
+            else:
+                yield from split_words(sentence, sentence_separator)
+
+
+def iter_chunks(text: str, chunk_tokens: int = 512, overlap_tokens: int = 64, model: str = "text-embedding-3-small") -> Iterator[str]:
+    """
+    Lazily yields chunks of `text` of at most about `chunk_tokens` tokens.
+    """
+    if not text or not text.strip():
+        return
+    chunk_tokens = max(1, chunk_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, chunk_tokens // 2))
+
+    seen = set()
+    current = deque()
+    current_tokens = 0
+    has_new_content = False
+
+    def emit():
+        chunk = "".join(
+            (separator if index else "") + unit for index, (separator, unit, _) in enumerate(current)
+        ).strip()
+        digest = hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).digest()
+        if chunk and digest not in seen:
+            seen.add(digest)
+            return chunk
+        return None
+
+    for unit in _units(text, chunk_tokens, model):
+        tokens = unit[2]
+        if current and current_tokens + tokens > chunk_tokens:
+            if has_new_content:
+                chunk = emit()
+                if chunk is not None:
+                    yield chunk
+
+            # Keep trailing units (up to the overlap budget) as the start of
+            # the next chunk, as long as the new unit still fits after them
+            carried = 0
+            keep = 0
+            for _, _, unit_tokens in reversed(current):
+                if carried + unit_tokens > overlap_tokens or carried + unit_tokens + tokens > chunk_tokens:
+                    break
+                carried += unit_tokens
+                keep += 1
+            while len(current) > keep:
+                current.popleft()
+            current_tokens = carried
+            has_new_content = False
+
+        current.append(unit)
+        current_tokens += tokens
+        has_new_content = True
+
+    if current and has_new_content:
+        chunk = emit()
+        if chunk is not None:
+            yield chunk
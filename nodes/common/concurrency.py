@@ -0,0 +1,46 @@
+"""
+Helpers for running asyncio code from synchronous ComfyUI node functions.
+
+ComfyUI may execute nodes from inside a running event loop, where
+`asyncio.run` is not allowed. Coroutines are instead submitted to a single
+long-lived loop on a daemon thread. Keeping one loop for the whole process
+also lets async HTTP clients (and their connection pools) be reused across
+node executions, since those clients are bound to the loop they run on.
+"""
+
+import asyncio
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the shared background event loop, starting it on first use.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="flowscale-llm-async",
+                    daemon=True,
+                )
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro, timeout: float = None):
+    """
+    Runs `coro` on the background loop and blocks until it finishes.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_background_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
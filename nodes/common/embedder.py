@@ -0,0 +1,166 @@
+"""
+Single entry point for generating OpenAI embeddings.
+
+`embed_texts` serves texts from the persistent embedding cache where it
+can, sends only the misses to the API (through the pooled client and the
+shared rate-limit scheduler) and returns one float32 matrix in input order.
+
+Misses are packed into requests that respect the API's per-request input
+count and token limits, and the requests are sent concurrently from a
+bounded thread pool. A batch that still fails after the scheduler's own
+retries is re-sent on its own, so one bad batch does not repeat the rest.
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from .embedding_cache import embedding_cache_key, get_embedding_cache
+from .embeddings import as_embedding_matrix, decode_openai_base64
+from .metrics import record_usage
+from .openai_client import get_openai_client
+from .scheduler import get_scheduler
+from .tokens import count_tokens, truncate_to_tokens
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_INPUTS_PER_REQUEST = int(os.environ.get("FLOWSCALE_EMBEDDING_MAX_INPUTS", "2048"))
+MAX_TOKENS_PER_REQUEST = int(os.environ.get("FLOWSCALE_EMBEDDING_MAX_TOKENS", "250000"))
+MAX_TOKENS_PER_INPUT = 8191
+EMBEDDING_CONCURRENCY = int(os.environ.get("FLOWSCALE_EMBEDDING_CONCURRENCY", "4"))
+BATCH_RETRY_ROUNDS = 2
+
+
+def pack_batches(token_counts: list, max_inputs: int = MAX_INPUTS_PER_REQUEST, max_tokens: int = MAX_TOKENS_PER_REQUEST) -> list:
+    """
+    Greedily groups consecutive inputs into batches of at most `max_inputs`
+    inputs and `max_tokens` tokens. Returns (start, end) index ranges.
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for index, tokens in enumerate(token_counts):
+        if index > start and (index - start >= max_inputs or batch_tokens + tokens > max_tokens):
+            batches.append((start, index))
+            start = index
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+def _request_batch(api_key: str, model: str, texts: list, token_count: int, dimensions: int, node: str) -> "np.ndarray":
+    import numpy as np
+
+    client = get_openai_client(api_key, max_retries=0)
+    # Only text-embedding-3 models accept `dimensions`
+    extra_args = {"dimensions": dimensions} if dimensions else {}
+
+    response = get_scheduler().call(
+        lambda: client.embeddings.with_raw_response.create(
+            input=texts,
+            model=model,
+            # Raw float32 bytes are smaller on the wire and skip JSON
+            # float parsing
+            encoding_format="base64",
+            **extra_args,
+        ),
+        api_key=api_key,
+        model=model,
+        estimated_tokens=token_count,
+    )
+    record_usage(node, response.usage)
+
+    rows = sorted(response.data, key=lambda item: item.index)
+    return as_embedding_matrix(np.stack([decode_openai_base64(item.embedding) for item in rows]))
+
+
+def request_embeddings(api_key: str, model: str, texts: list, dimensions: int = 0, node: str = "embedding", concurrency: int = EMBEDDING_CONCURRENCY) -> "np.ndarray":
+    """
+    Embeds `texts` through the API (bypassing the cache), packing them into
+    as few requests as the limits allow and sending those concurrently.
+    """
+    import numpy as np
+
+    texts = list(texts)
+    token_counts = []
+    for index, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if tokens > MAX_TOKENS_PER_INPUT:
+            logger.warning(f"Truncating embedding input {index} from {tokens} to {MAX_TOKENS_PER_INPUT} tokens")
+            texts[index] = truncate_to_tokens(text, MAX_TOKENS_PER_INPUT, model)
+            tokens = MAX_TOKENS_PER_INPUT
+        token_counts.append(tokens)
+
+    batches = pack_batches(token_counts)
+    results = {}
+
+    def run(batch):
+        start, end = batch
+        return _request_batch(api_key, model, texts[start:end], sum(token_counts[start:end]), dimensions, node)
+
+    pending = batches
+    errors = {}
+    for _ in range(BATCH_RETRY_ROUNDS + 1):
+        if not pending:
+            break
+        if len(pending) == 1:
+            outcomes = [(pending[0], _capture(run, pending[0]))]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending)))) as pool:
+                outcomes = list(zip(pending, pool.map(lambda batch: _capture(run, batch), pending)))
+
+        pending = []
+        for batch, (matrix, error) in outcomes:
+            if error is None:
+                results[batch] = matrix
+            else:
+                errors[batch] = error
+                pending.append(batch)
+        if pending:
+            logger.warning(f"Retrying {len(pending)} of {len(batches)} embedding batches")
+
+    if pending:
+        raise errors[pending[0]]
+    return as_embedding_matrix(np.concatenate([results[batch] for batch in batches]))
+
+
+def _capture(func, *args):
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, e
+
+
+def embed_texts(api_key: str, model: str, texts: list, dimensions: int = 0, node: str = "embedding", use_cache: bool = True) -> "np.ndarray":
+    """
+    Returns a (len(texts), dims) float32 matrix, using cached vectors where
+    available. API errors propagate to the caller.
+    """
+    import numpy as np
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return request_embeddings(api_key, model, texts, dimensions, node)
+
+    keys = [embedding_cache_key(model, dimensions, text) for text in texts]
+    cached = cache.get_many(keys)
+
+    # Embed each distinct missing text once, even if it repeats in `texts`
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+
+    if missing:
+        fresh = request_embeddings(api_key, model, list(missing.values()), dimensions, node)
+        new_vectors = dict(zip(missing.keys(), fresh))
+        cache.put_many(new_vectors)
+        cached.update(new_vectors)
+
+    return as_embedding_matrix(np.stack([cached[key] for key in keys]))
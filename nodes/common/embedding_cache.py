@@ -0,0 +1,309 @@
+"""
+Persistent cache of embedding vectors.
+
+Vectors are keyed by a SHA-256 of (model, dimensions, normalized text) and
+stored compactly: a SQLite index maps each key to an offset in an
+append-only float32 blob file, which is read through a memory map. Lookups
+are batched, so a list of texts costs one index query and the API is only
+asked for the misses. When the live vectors exceed
+`FLOWSCALE_EMBEDDING_CACHE_MAX_BYTES` the least recently used entries are
+dropped, and the blob file is compacted once most of it is dead space.
+Several processes may share one cache directory.
+Set `FLOWSCALE_EMBEDDING_CACHE=0` to disable it.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .response_cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_ENABLED = os.environ.get("FLOWSCALE_EMBEDDING_CACHE", "1").lower() not in ("0", "false", "no", "off")
+EMBEDDING_CACHE_DIR = os.environ.get("FLOWSCALE_EMBEDDING_CACHE_DIR", os.path.join(CACHE_DIR, "embeddings"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("FLOWSCALE_EMBEDDING_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+# Bytes per float32; NumPy is only imported once the cache is used
+_ITEM_SIZE = 4
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embedding_cache_key(model: str, dimensions, text: str) -> str:
+    payload = f"{model}\x00{dimensions or 0}\x00{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Safe to share between processes (e.g. several ComfyUI instances using
+    the same cache directory): appends and compaction hold an exclusive
+    `flock` on the directory's lock file and lookups a shared one, so
+    offsets are always taken from the real end of the blob. Compaction
+    writes a new blob generation, commits the new offsets and blob name in
+    one transaction and only then deletes the old file, so a crash at any
+    point leaves the index pointing at a complete blob. Appended vectors
+    are fsynced before their offsets are committed, and an entry that
+    still points past the end of the blob is treated as a miss.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock_file = open(os.path.join(directory, "lock"), "a+b")
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                key TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                dims INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS vectors_accessed ON vectors (accessed);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._conn.commit()
+
+        self._map = None
+        self._map_name = None
+        self._map_size = 0
+        with self._file_lock(exclusive=True):
+            open(self._blob_path(self._blob_name()), "ab").close()
+            self._remove_stale_blobs_locked()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """
+        Serializes threads of this process, then other processes.
+        """
+        with self._lock:
+            if fcntl is None:
+                # No flock (Windows): only safe for a single process
+                yield
+                return
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _blob_name(self) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'blob'").fetchone()
+        return row[0] if row else "vectors.f32"
+
+    def _blob_path(self, name: str) -> str:
+        return os.path.join(self._directory, name)
+
+    def _remove_stale_blobs_locked(self):
+        # Left behind by a compaction that crashed before or after its commit
+        current = self._blob_name()
+        for name in os.listdir(self._directory):
+            if name.startswith("vectors.") and name.endswith((".f32", ".f32.tmp")) and name != current:
+                try:
+                    os.remove(self._blob_path(name))
+                except OSError:
+                    pass
+
+    def _mapped(self, name: str):
+        import numpy as np
+
+        # Remap only when the blob was replaced or has grown since the last map
+        path = self._blob_path(name)
+        size = os.path.getsize(path)
+        if self._map is None or name != self._map_name or size != self._map_size:
+            # A torn append can leave a partial float at the end; map whole ones
+            count = size // _ITEM_SIZE
+            self._map = np.memmap(path, dtype=np.float32, mode="r", shape=(count,)) if count else np.empty(0, dtype=np.float32)
+            self._map_name = name
+            self._map_size = size
+        return self._map
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Returns {key: vector} for the keys that are cached.
+        """
+        import numpy as np
+
+        found = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._file_lock(exclusive=False):
+            rows = []
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _LOOKUP_CHUNK):
+                chunk = unique_keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self._conn.execute(
+                    f"SELECT key, offset, dims FROM vectors WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+            if not rows:
+                return found
+
+            blob = self._mapped(self._blob_name())
+            truncated = []
+            for key, offset, dims in rows:
+                start = offset // _ITEM_SIZE
+                vector = blob[start:start + dims]
+                if len(vector) != dims:
+                    # The index outlived the blob's tail (e.g. lost on power
+                    # failure): a miss, and forgotten so it is stored again
+                    truncated.append((key,))
+                    continue
+                found[key] = np.array(vector, dtype=np.float32)
+
+            if truncated:
+                logger.warning(f"Dropping {len(truncated)} embedding cache entries past the end of the blob")
+                self._conn.executemany("DELETE FROM vectors WHERE key = ?", truncated)
+            self._conn.executemany("UPDATE vectors SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Stores {key: vector}. Keys that are already cached are skipped.
+        """
+        import numpy as np
+
+        if not items:
+            return
+        now = time.time()
+        with self._file_lock(exclusive=True):
+            existing = set()
+            keys = list(items)
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(
+                    row[0] for row in self._conn.execute(f"SELECT key FROM vectors WHERE key IN ({placeholders})", chunk)
+                )
+
+            rows = []
+            blob_name = self._blob_name()
+            with open(self._blob_path(blob_name), "ab") as blob:
+                # Append mode positions at the end, which the lock keeps stable
+                blob.seek(0, os.SEEK_END)
+                offset = blob.tell()
+                if offset % _ITEM_SIZE:
+                    # Pad past a torn append so offsets stay float-aligned
+                    padding = _ITEM_SIZE - offset % _ITEM_SIZE
+                    blob.write(b"\0" * padding)
+                    offset += padding
+                for key, vector in items.items():
+                    if key in existing:
+                        continue
+                    data = np.ascontiguousarray(vector, dtype=np.float32)
+                    blob.write(data.tobytes())
+                    rows.append((key, offset, data.size, now))
+                    offset += data.nbytes
+                # The vectors must be on disk before the index points at them
+                blob.flush()
+                os.fsync(blob.fileno())
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, offset, dims, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            compact = self._evict_locked(blob_name)
+            self._conn.commit()
+            if compact:
+                self._compact_locked(blob_name)
+
+    def _evict_locked(self, blob_name: str) -> bool:
+        """
+        Drops least recently used entries until the live vectors fit in
+        `max_bytes`. Returns True if the blob is now mostly dead space.
+        """
+        # Other processes write too, so count from the index, not in memory
+        live_bytes = self._conn.execute("SELECT COALESCE(SUM(dims), 0) FROM vectors").fetchone()[0] * _ITEM_SIZE
+
+        while live_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, dims FROM vectors ORDER BY accessed ASC LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, dims in rows:
+                if live_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM vectors WHERE key = ?", (key,))
+                live_bytes -= dims * _ITEM_SIZE
+
+        return os.path.getsize(self._blob_path(blob_name)) > 2 * live_bytes
+
+    def _compact_locked(self, blob_name: str):
+        """
+        Rewrites the live vectors into the next blob generation.
+        """
+        import numpy as np
+
+        generation = int(self._conn.execute("SELECT COALESCE((SELECT value FROM meta WHERE key = 'generation'), 0)").fetchone()[0]) + 1
+        new_name = f"vectors.{generation}.f32"
+        tmp_path = self._blob_path(new_name + ".tmp")
+
+        blob = self._mapped(blob_name)
+        updates = []
+        with open(tmp_path, "wb") as out:
+            offset = 0
+            for key, old_offset, dims in self._conn.execute("SELECT key, offset, dims FROM vectors ORDER BY offset"):
+                start = old_offset // _ITEM_SIZE
+                out.write(np.asarray(blob[start:start + dims], dtype=np.float32).tobytes())
+                updates.append((offset, key))
+                offset += dims * _ITEM_SIZE
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self._blob_path(new_name))
+
+        # The index switches to the new blob atomically; the old one is only
+        # removed once nothing can point into it
+        with self._conn:
+            self._conn.executemany("UPDATE vectors SET offset = ? WHERE key = ?", updates)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("blob", new_name), ("generation", str(generation))],
+            )
+        self._map = None
+        os.remove(self._blob_path(blob_name))
+        logger.info(f"Compacted embedding cache to {offset} bytes")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache, or None if it is disabled or
+    cannot be opened.
+    """
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache(EMBEDDING_CACHE_DIR)
+                except Exception:
+                    logger.exception("Failed to open embedding cache; continuing without it.")
+                    return None
+    return _cache
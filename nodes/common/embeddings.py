@@ -0,0 +1,74 @@
+"""
+Compact embedding representation shared by the embedding and vector nodes.
+
+Embeddings travel between nodes as the ComfyUI type "EMBEDDING": a
+C-contiguous float32 NumPy matrix with one row per input text. That is
+about a quarter of the memory of a list of Python floats and needs no
+parsing. When an embedding has to cross a STRING boundary it is encoded
+as "f32:<rows>x<dims>:<base64 little-endian float32>". NumPy is imported
+on first use, so loading the nodes does not pay for it.
+"""
+
+import json
+import base64
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+EMBEDDING_TYPE = "EMBEDDING"
+B64_PREFIX = "f32:"
+
+
+def as_embedding_matrix(vectors) -> "np.ndarray":
+    """
+    Returns `vectors` as a 2-D contiguous float32 matrix (a single vector
+    becomes one row).
+    """
+    import numpy as np
+
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return matrix
+
+
+def decode_openai_base64(data: str) -> "np.ndarray":
+    """
+    Decodes an embedding requested with encoding_format="base64".
+    """
+    import numpy as np
+
+    return np.frombuffer(base64.b64decode(data), dtype="<f4")
+
+
+def embedding_to_base64(matrix) -> str:
+    matrix = as_embedding_matrix(matrix)
+    rows, dims = matrix.shape
+    payload = base64.b64encode(matrix.astype("<f4", copy=False).tobytes()).decode("ascii")
+    return f"{B64_PREFIX}{rows}x{dims}:{payload}"
+
+
+def embedding_from_base64(value: str) -> "np.ndarray":
+    import numpy as np
+
+    header, payload = value[len(B64_PREFIX):].split(":", 1)
+    rows, dims = (int(part) for part in header.split("x"))
+    return np.frombuffer(base64.b64decode(payload), dtype="<f4").reshape(rows, dims).astype(np.float32, copy=False)
+
+
+def coerce_embedding(value) -> "np.ndarray":
+    """
+    Accepts an EMBEDDING matrix, a base64 string from `embedding_to_base64`,
+    a JSON array string, or a (nested) list of floats.
+    """
+    import numpy as np
+
+    if isinstance(value, np.ndarray):
+        return as_embedding_matrix(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith(B64_PREFIX):
+            return embedding_from_base64(value)
+        value = json.loads(value)
+    return as_embedding_matrix(value)
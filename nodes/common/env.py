@@ -0,0 +1,22 @@
+"""
+One-time environment setup for the package.
+
+The `.env` file is loaded once, before any node module is imported, so
+module-level settings (the `FLOWSCALE_...` variables) already see it.
+"""
+
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_environment():
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        import dotenv
+
+        dotenv.load_dotenv()
+        _loaded = True
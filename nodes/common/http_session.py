@@ -0,0 +1,46 @@
+"""
+Pooled `requests` sessions, one per endpoint origin.
+
+A bare `requests.post` opens a new TCP connection for every call. Sessions
+here are shared per scheme://host:port so keep-alive connections are reused
+across node executions and threads.
+"""
+
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_CONNECTIONS = int(os.environ.get("FLOWSCALE_HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("FLOWSCALE_HTTP_POOL_MAXSIZE", "16"))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def endpoint_origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Returns the shared session for the origin of `url`, creating it on
+    first use.
+    """
+    origin = endpoint_origin(url)
+    session = _sessions.get(origin)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[origin] = session
+    return session
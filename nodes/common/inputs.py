@@ -0,0 +1,87 @@
+"""
+Parsing helpers for free-form node inputs.
+"""
+
+import json
+
+
+def parse_prompt_list(prompts: str):
+    """
+    Accepts either a JSON array of prompts or one prompt per line.
+    """
+    text = (prompts or "").strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        try:
+            items = json.loads(text)
+            if isinstance(items, list):
+                return [item if isinstance(item, str) else json.dumps(item) for item in items]
+        except json.JSONDecodeError:
+            pass
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+
+def _is_record(item) -> bool:
+    if isinstance(item, str):
+        return True
+    if isinstance(item, dict):
+        return any(key in item for key in ("text", "content", "page_content"))
+    return (
+        isinstance(item, (list, tuple)) and 1 <= len(item) <= 2 and isinstance(item[0], str)
+        and (len(item) == 1 or isinstance(item[1], dict))
+    )
+
+
+def _parse_record(item, position: int):
+    if isinstance(item, str):
+        return item, {}, None
+    if isinstance(item, (list, tuple)) and 1 <= len(item) <= 2 and isinstance(item[0], str):
+        metadata = item[1] if len(item) == 2 else {}
+        if not isinstance(metadata, dict):
+            raise ValueError(f"record {position}: metadata must be a JSON object")
+        return item[0], metadata, None
+    if isinstance(item, dict):
+        text = next((item[key] for key in ("text", "content", "page_content") if key in item), None)
+        if not isinstance(text, str):
+            raise ValueError(f"record {position}: expected a string \"text\" field")
+        metadata = item.get("metadata") or {}
+        if not isinstance(metadata, dict):
+            raise ValueError(f"record {position}: metadata must be a JSON object")
+        doc_id = item.get("_id", item.get("id"))
+        return text, metadata, None if doc_id is None else str(doc_id)
+    raise ValueError(f"record {position}: expected an object, a [text, metadata] pair or a string")
+
+
+def parse_record_list(records: str):
+    """
+    Accepts either a JSON array of records or JSON Lines, one record per
+    line. A record is an object with "text" (or "content"), optional
+    "metadata" and optional "_id"; a [text, metadata] pair; or a string.
+    Returns (text, metadata, _id) tuples, _id None when not given, and
+    drops records with blank text. Raises ValueError on malformed input.
+    """
+    text = (records or "").strip()
+    if not text:
+        return []
+    items = None
+    if text.startswith("["):
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError:
+            pass  # JSON Lines of [text, metadata] pairs
+    # A single JSON Lines pair such as ["text", {...}] also parses as a list
+    if isinstance(items, list) and all(_is_record(item) for item in items):
+        numbered = enumerate(items, start=1)
+    else:
+        numbered = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                numbered.append((number, json.loads(line)))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {number}: {e}")
+    parsed = [_parse_record(item, position) for position, item in numbered]
+    return [record for record in parsed if record[0].strip()]
@@ -0,0 +1,217 @@
+"""
+Low-overhead metrics for the node hot paths.
+
+Nodes record latency histograms and counters (calls, errors, tokens,
+bytes) labelled by node name instead of logging whole payloads. Metrics
+are exposed in Prometheus text format at `/flowscale/metrics` on the
+ComfyUI server, and written to `FLOWSCALE_METRICS_FILE` every
+`FLOWSCALE_METRICS_DUMP_INTERVAL` seconds when that variable is set.
+
+`log_sampled` is for payload logging: it only formats its arguments when
+DEBUG is enabled for the logger, and then only for a sampled fraction
+(`FLOWSCALE_LOG_SAMPLE_RATE`) of calls.
+"""
+
+import os
+import time
+import random
+import logging
+import functools
+import threading
+
+logger = logging.getLogger(__name__)
+
+LOG_SAMPLE_RATE = float(os.environ.get("FLOWSCALE_LOG_SAMPLE_RATE", "0.1"))
+METRICS_FILE = os.environ.get("FLOWSCALE_METRICS_FILE", "")
+METRICS_DUMP_INTERVAL = float(os.environ.get("FLOWSCALE_METRICS_DUMP_INTERVAL", "30"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def log_sampled(log: logging.Logger, msg: str, *args):
+    """
+    Logs `msg % args` at DEBUG for a sampled fraction of calls. Arguments
+    are passed through unformatted, so large objects cost nothing unless
+    the record is actually emitted.
+    """
+    if log.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE:
+        log.debug(msg, *args)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+
+    def inc(self, labels: tuple, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, labels: tuple, value: float):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        else:
+            state[len(self.buckets)] += 1
+        state[-1] += value
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, state in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), state[:-1]):
+                cumulative += count
+                bucket_labels = _format_labels(label_names + ("le",), labels + (str(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(label_names, labels)} {state[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(label_names, labels)} {cumulative}")
+        return lines
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+_lock = threading.Lock()
+_latency = Histogram("flowscale_node_latency_seconds", "Node execution latency in seconds.")
+_calls = Counter("flowscale_node_calls_total", "Node executions.")
+_errors = Counter("flowscale_node_errors_total", "Node executions that failed.")
+_tokens = Counter("flowscale_tokens_total", "Model tokens processed, by kind (prompt/completion).")
+_bytes = Counter("flowscale_bytes_total", "Payload bytes moved, by direction (in/out).")
+
+
+def observe_latency(node: str, seconds: float):
+    with _lock:
+        _latency.observe((node,), seconds)
+        _calls.inc((node,))
+
+
+def record_error(node: str):
+    with _lock:
+        _errors.inc((node,))
+
+
+def record_tokens(node: str, prompt: int = 0, completion: int = 0):
+    with _lock:
+        if prompt:
+            _tokens.inc((node, "prompt"), prompt)
+        if completion:
+            _tokens.inc((node, "completion"), completion)
+
+
+def record_usage(node: str, usage):
+    """
+    Records tokens from an OpenAI `usage` object (or None).
+    """
+    if usage is not None:
+        record_tokens(node, getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0)
+
+
+def record_bytes(node: str, amount: int, direction: str = "in"):
+    with _lock:
+        _bytes.inc((node, direction), amount)
+
+
+def timed(node: str):
+    """
+    Decorator recording latency and call count for a node function, and
+    an error if it raises.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                record_error(node)
+                raise
+            finally:
+                observe_latency(node, time.perf_counter() - started)
+                _maybe_start_dumper()
+        return wrapper
+    return decorator
+
+
+def render_prometheus() -> str:
+    with _lock:
+        lines = []
+        lines += _latency.render(("node",))
+        lines += _calls.render(("node",))
+        lines += _errors.render(("node",))
+        lines += _tokens.render(("node", "kind"))
+        lines += _bytes.render(("node", "direction"))
+    return "\n".join(lines) + "\n"
+
+
+def dump_metrics(path: str = METRICS_FILE):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+_dumper_started = False
+
+
+def _maybe_start_dumper():
+    global _dumper_started
+    if not METRICS_FILE or _dumper_started:
+        return
+    with _lock:
+        if _dumper_started:
+            return
+        _dumper_started = True
+
+    def run():
+        while True:
+            time.sleep(METRICS_DUMP_INTERVAL)
+            try:
+                dump_metrics(METRICS_FILE)
+            except OSError:
+                logger.warning("Failed to write metrics file", exc_info=True)
+
+    threading.Thread(target=run, name="flowscale-metrics-dump", daemon=True).start()
+
+
+def register_metrics_route():
+    """
+    Serves the metrics at /flowscale/metrics on the ComfyUI server, if
+    running inside ComfyUI.
+    """
+    try:
+        from aiohttp import web
+        from server import PromptServer
+    except ImportError:
+        return False
+
+    async def metrics_handler(request):
+        return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    try:
+        PromptServer.instance.routes.get("/flowscale/metrics")(metrics_handler)
+    except AttributeError:
+        return False
+    return True
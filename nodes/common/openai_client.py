@@ -0,0 +1,159 @@
+"""
+Process-wide registry of pooled OpenAI clients.
+
+Building an ``OpenAI`` client per node execution creates a new HTTP
+connection pool each time, so every call pays for a fresh TCP + TLS
+handshake. Nodes fetch a shared client from here instead. Clients are
+keyed by everything that changes how they talk to the API
+(api_key, base_url, timeout, max_retries) and kept in a bounded LRU so
+rarely used keys eventually release their sockets once no request is
+using them any more.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import OpenAI, AsyncOpenAI
+
+
+MAX_CLIENTS = int(os.environ.get("FLOWSCALE_OPENAI_MAX_CLIENTS", "16"))
+MAX_CONNECTIONS = int(os.environ.get("FLOWSCALE_OPENAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("FLOWSCALE_OPENAI_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.environ.get("FLOWSCALE_OPENAI_KEEPALIVE_EXPIRY", "60"))
+
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_MAX_RETRIES = 2
+
+
+def _connection_limits() -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+class ClientRegistry:
+    """
+    Thread-safe LRU of API clients built on demand by `factory(*key)`.
+    Evicted clients are only forgotten, never closed: another thread may
+    still be mid-request on one, so its connection pool is released by
+    garbage collection once the last user lets go of it.
+    """
+
+    def __init__(self, factory, max_size: int = MAX_CLIENTS):
+        self._factory = factory
+        self._max_size = max(1, max_size)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+        # Built outside the lock so a slow build does not block other keys
+        client = self._factory(*key)
+
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                # Another thread built the same client first; share its pool
+                self._clients.move_to_end(key)
+                return existing
+            self._clients[key] = client
+            while len(self._clients) > self._max_size:
+                self._clients.popitem(last=False)
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+def account_id(client) -> str:
+    """
+    Identifies the account and server a client talks to (API key and base
+    URL), hashed so the key itself never ends up in a cache or job key.
+    """
+    payload = f"{getattr(client, 'api_key', '')}\x00{getattr(client, 'base_url', '')}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _build_openai_client(api_key, base_url, timeout, max_retries):
+    # openai takes about a second to import, so it is loaded on first use
+    from openai import OpenAI, DefaultHttpxClient
+
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=max_retries,
+        http_client=DefaultHttpxClient(limits=_connection_limits(), timeout=timeout),
+    )
+
+
+def _build_async_openai_client(api_key, base_url, timeout, max_retries):
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=max_retries,
+        http_client=DefaultAsyncHttpxClient(limits=_connection_limits(), timeout=timeout),
+    )
+
+
+_openai_clients = ClientRegistry(_build_openai_client)
+_async_openai_clients = ClientRegistry(_build_async_openai_client)
+
+
+def get_openai_client(
+    api_key: str,
+    base_url: str = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> "OpenAI":
+    """
+    Returns a shared `OpenAI` client for the given settings, creating it on
+    first use. The client keeps its connections alive between node runs.
+    """
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL") or None
+    return _openai_clients.get((api_key, base_url, timeout, max_retries))
+
+
+def get_async_openai_client(
+    api_key: str,
+    base_url: str = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> "AsyncOpenAI":
+    """
+    Returns a shared `AsyncOpenAI` client. Async clients are bound to the
+    event loop they run on, so only await them via `concurrency.run_sync`.
+    """
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL") or None
+    return _async_openai_clients.get((api_key, base_url, timeout, max_retries))
+
+
+def clear_openai_clients():
+    """
+    Forgets every pooled client (e.g. after rotating API keys). Requests
+    already running on them are left to finish.
+    """
+    _openai_clients.clear()
+    _async_openai_clients.clear()
@@ -0,0 +1,85 @@
+"""
+Minimal staged pipeline with bounded queues between stages.
+
+Each stage runs in its own thread and hands its output to the next stage
+through a queue holding at most `queue_size` items. Slow downstream
+stages therefore apply back-pressure instead of letting work pile up in
+memory, and consecutive stages overlap (stage 2 works on item N while
+stage 1 produces item N+1).
+"""
+
+import queue
+import threading
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+def run_pipeline(source, stages, queue_size: int = 2) -> list:
+    """
+    Feeds every item of `source` through `stages` (callables applied in
+    order) and returns the outputs of the last stage in source order. The
+    first exception raised by any stage stops the pipeline and is re-raised.
+    """
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    results = []
+    errors = []
+    stop = threading.Event()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while True:
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if stop.is_set():
+                    return _DONE
+
+    def worker(stage, inbox, outbox):
+        try:
+            while not stop.is_set():
+                item = get(inbox)
+                if item is _DONE:
+                    break
+                output = stage(item)
+                if outbox is None:
+                    results.append(output)
+                elif not put(outbox, output):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if outbox is not None:
+                put(outbox, _DONE)
+
+    threads = []
+    for index, stage in enumerate(stages):
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        thread = threading.Thread(target=worker, args=(stage, queues[index], outbox), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    try:
+        for item in source:
+            if not put(queues[0], item):
+                break
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        put(queues[0], _DONE)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,170 @@
+"""
+Persistent, content-addressed cache for LLM responses.
+
+Entries are keyed by a SHA-256 of everything that determines a completion
+(model, messages / system prompt, sampling parameters) and live in a small
+SQLite database so they survive ComfyUI restarts. Each entry expires after
+`FLOWSCALE_LLM_CACHE_TTL` seconds and the database is trimmed back under
+`FLOWSCALE_LLM_CACHE_MAX_BYTES` by evicting the least recently used rows.
+Set `FLOWSCALE_LLM_CACHE=0` to disable caching process-wide.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.environ.get("FLOWSCALE_LLM_CACHE", "1").lower() not in ("0", "false", "no", "off")
+CACHE_DIR = os.environ.get(
+    "FLOWSCALE_LLM_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "flowscale-llm-nodes"),
+)
+CACHE_TTL = float(os.environ.get("FLOWSCALE_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.environ.get("FLOWSCALE_LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def make_cache_key(namespace: str, **params) -> str:
+    """
+    Hashes `params` into a stable hex key. Parameters are serialized as
+    canonical JSON, so dict ordering and whitespace never change the key.
+    """
+    payload = json.dumps(
+        {"namespace": namespace, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed key/value store with TTL expiry and a byte-size cap.
+    A single connection is shared between threads behind a lock.
+    """
+
+    def __init__(self, path: str, ttl: float = CACHE_TTL, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str):
+        """
+        Returns the cached value for `key`, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, size, created = row
+            if self.ttl > 0 and now - created > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= size
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def contains(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and (self.ttl <= 0 or now - row[0] <= self.ttl)
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def _evict_locked(self, now: float):
+        if self.ttl > 0:
+            expired = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?", (now - self.ttl,)
+            ).fetchone()[0]
+            if expired:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                self._total_bytes -= expired
+
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Returns the process-wide response cache, or None if caching is disabled
+    or the cache database cannot be opened.
+    """
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = ResponseCache(os.path.join(CACHE_DIR, "responses.sqlite3"))
+                except Exception:
+                    logger.exception("Failed to open LLM response cache; continuing without it.")
+                    return None
+    return _cache
@@ -0,0 +1,315 @@
+"""
+Shared rate-limit-aware scheduler for OpenAI requests.
+
+Every OpenAI-backed node routes its calls through one process-wide
+`RequestScheduler`, so workflows sharing an API key also share its limits:
+
+- Per (api_key, model) token buckets for requests/minute and tokens/minute.
+  They start unlimited and learn the real limits from the
+  `x-ratelimit-*` headers OpenAI returns on every response.
+- Retries for 429s, timeouts and 5xx errors with full-jitter exponential
+  backoff, honouring `Retry-After` when the server sends one.
+- An AIMD concurrency limit per key/model: halved whenever we get
+  throttled, grown by one after a full window of successful calls.
+
+Calls must be made with `with_raw_response` so headers are visible, and
+the clients should be created with `max_retries=0` so the SDK does not
+retry underneath the scheduler.
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import threading
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = int(os.environ.get("FLOWSCALE_OPENAI_MAX_RETRIES", "6"))
+BACKOFF_BASE = float(os.environ.get("FLOWSCALE_OPENAI_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.environ.get("FLOWSCALE_OPENAI_BACKOFF_MAX", "30"))
+INITIAL_CONCURRENCY = int(os.environ.get("FLOWSCALE_OPENAI_INITIAL_CONCURRENCY", "8"))
+MAX_CONCURRENCY = int(os.environ.get("FLOWSCALE_OPENAI_MAX_CONCURRENCY", "64"))
+
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    # openai is imported on first use so loading the nodes stays cheap
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value) -> float:
+    """
+    Parses OpenAI reset durations such as "20ms", "1s" or "6m0s" into seconds.
+    """
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_PART.findall(value))
+
+
+def estimate_request_tokens(text: str, max_completion_tokens: int = 0) -> int:
+    """
+    Rough token estimate used to reserve TPM budget before a request
+    (about four characters per token, plus the completion allowance).
+    """
+    return len(text or "") // 4 + 1 + (max_completion_tokens or 0)
+
+
+class TokenBucket:
+    """
+    Continuous-refill token bucket. `capacity=None` means unlimited until a
+    limit is learned from response headers.
+    """
+
+    def __init__(self, capacity=None, period: float = 60.0):
+        self.capacity = capacity
+        self.period = period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.capacity is None:
+            return
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / self.period)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Takes `amount` from the bucket and returns how long the caller must
+        wait before the reservation is covered (0 if it already is).
+        """
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens * self.period / self.capacity
+
+    def observe(self, limit, remaining, reset_seconds, now):
+        if limit:
+            if self.capacity is None:
+                self.tokens = limit
+            self.capacity = limit
+            self._refill(now)
+        if remaining is not None and self.capacity is not None:
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset_seconds:
+                # Out of budget until the server-side window resets
+                self.tokens = -reset_seconds * self.capacity / self.period
+
+
+class ModelLimits:
+    """
+    Rate and concurrency state for one (api_key, model) pair.
+    """
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.concurrency = INITIAL_CONCURRENCY
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled_until = 0.0
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            if self.in_flight < self.concurrency:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self.lock:
+            while self.in_flight >= self.concurrency:
+                self.lock.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.lock.notify()
+
+    def reserve(self, estimated_tokens: int) -> float:
+        now = time.monotonic()
+        with self.lock:
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(estimated_tokens, now),
+                self.throttled_until - now,
+            )
+        return max(wait, 0.0)
+
+    def on_success(self, headers):
+        now = time.monotonic()
+        with self.lock:
+            if headers is not None:
+                self.requests.observe(
+                    _int_header(headers, "x-ratelimit-limit-requests"),
+                    _int_header(headers, "x-ratelimit-remaining-requests"),
+                    parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+                    now,
+                )
+                self.tokens.observe(
+                    _int_header(headers, "x-ratelimit-limit-tokens"),
+                    _int_header(headers, "x-ratelimit-remaining-tokens"),
+                    parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+                    now,
+                )
+            # Additive increase: one more slot per window of clean calls
+            self.successes += 1
+            if self.successes >= self.concurrency and self.concurrency < MAX_CONCURRENCY:
+                self.concurrency += 1
+                self.successes = 0
+                self.lock.notify()
+
+    def on_throttled(self, retry_after: float):
+        with self.lock:
+            # Multiplicative decrease
+            self.concurrency = max(1, self.concurrency // 2)
+            self.successes = 0
+            self.throttled_until = max(self.throttled_until, time.monotonic() + retry_after)
+
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(error) -> float:
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+    for name in ("retry-after-ms", "retry-after"):
+        value = response.headers.get(name)
+        if value:
+            try:
+                seconds = float(value)
+            except ValueError:
+                continue
+            return seconds / 1000.0 if name.endswith("-ms") else seconds
+    return 0.0
+
+
+def _backoff(attempt: int, retry_after: float) -> float:
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    return max(delay, retry_after)
+
+
+class RequestScheduler:
+
+    def __init__(self):
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def limits_for(self, api_key: str, model: str) -> ModelLimits:
+        key = (api_key, model)
+        with self._lock:
+            limits = self._limits.get(key)
+            if limits is None:
+                limits = self._limits[key] = ModelLimits()
+            return limits
+
+    def call(self, request, *, api_key: str, model: str, estimated_tokens: int = 0):
+        """
+        Runs `request()` (a `with_raw_response` call) under the rate limits
+        for api_key/model, retrying retryable errors. Returns the parsed
+        response object.
+        """
+        limits = self.limits_for(api_key, model)
+        for attempt in range(MAX_RETRIES + 1):
+            wait = limits.reserve(estimated_tokens)
+            if wait > 0:
+                time.sleep(wait)
+
+            limits.acquire()
+            try:
+                raw_response = request()
+            except retryable_errors() as e:
+                delay = self._on_error(limits, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            finally:
+                limits.release()
+
+            limits.on_success(raw_response.headers)
+            return raw_response.parse()
+
+    async def acall(self, request, *, api_key: str, model: str, estimated_tokens: int = 0):
+        """
+        Async variant of `call`; `request()` must return an awaitable.
+        """
+        limits = self.limits_for(api_key, model)
+        for attempt in range(MAX_RETRIES + 1):
+            wait = limits.reserve(estimated_tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            while not limits.try_acquire():
+                await asyncio.sleep(0.05)
+            try:
+                raw_response = await request()
+            except retryable_errors() as e:
+                delay = self._on_error(limits, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                limits.release()
+
+            limits.on_success(raw_response.headers)
+            return raw_response.parse()
+
+    def _on_error(self, limits: ModelLimits, error, attempt: int):
+        """
+        Records a failed attempt and returns the delay before retrying, or
+        None when retries are exhausted.
+        """
+        import openai
+
+        retry_after = _retry_after(error)
+        if isinstance(error, openai.RateLimitError):
+            if getattr(error, "code", None) == "insufficient_quota":
+                # Billing problem, not throttling; waiting will not help
+                return None
+            limits.on_throttled(retry_after)
+        if attempt >= MAX_RETRIES:
+            return None
+        delay = _backoff(attempt, retry_after)
+        logger.warning(f"OpenAI request failed ({type(error).__name__}), retrying in {delay:.2f}s")
+        return delay
+
+
+_scheduler = RequestScheduler()
+
+
+def get_scheduler() -> RequestScheduler:
+    return _scheduler
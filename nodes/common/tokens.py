@@ -0,0 +1,212 @@
+"""
+Token accounting for chat requests.
+
+Counts are computed locally with tiktoken before a request is sent, so
+oversized prompts are truncated or rejected without a network round-trip
+and `max_completion_tokens` can be sized to the room actually left in the
+model's context window. Encodings are loaded once per model; counts are
+not memoized, so no prompt or document text is kept alive. Without
+tiktoken installed the counts fall back to a ~4 characters/token estimate.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-3.5-turbo-0125": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "o1": 200000,
+    "o1-mini": 128000,
+    "o1-preview": 128000,
+}
+
+MODEL_MAX_OUTPUT_TOKENS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-0125": 4096,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 4096,
+    "gpt-4o-mini": 16384,
+    "gpt-4o": 16384,
+    "o1": 100000,
+    "o1-mini": 65536,
+    "o1-preview": 32768,
+}
+
+# Chat formatting overhead (see OpenAI's token counting cookbook): every
+# message is wrapped in a few control tokens and the reply is primed with 3.
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+CHARS_PER_TOKEN = 4
+
+OVERFLOW_STRATEGIES = ["truncate", "reject"]
+
+
+class ContextWindowExceeded(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """
+    Returns the tiktoken encoding for `model`, or None without tiktoken.
+    """
+    # tiktoken takes a few hundred milliseconds to import, so it is loaded
+    # on first use rather than when the nodes are registered
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base" if model.startswith(("gpt-4o", "o1")) else "cl100k_base")
+    except Exception:
+        # tiktoken downloads encoding files on first use; offline hosts
+        # fall back to the character estimate rather than failing
+        logger.warning(f"Could not load tiktoken encoding for {model}; estimating token counts", exc_info=True)
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_to_tokens(text: str, max_tokens: int, model: str) -> Iterator[Tuple[str, int]]:
+    """
+    Cuts `text` into consecutive pieces of about `max_tokens` tokens,
+    yielding (piece, tokens). Cuts are made between token ids, never inside
+    a character that spans several tokens, so dense text such as CJK is not
+    packed several times over budget. Without tiktoken the
+    pieces are `max_tokens * CHARS_PER_TOKEN` characters.
+    """
+    max_tokens = max(1, max_tokens)
+    encoding = get_encoding(model)
+    if encoding is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        for start in range(0, len(text), step):
+            piece = text[start:start + step]
+            yield piece, count_tokens(piece, model)
+        return
+
+    tokens = encoding.encode(text, disallowed_special=())
+    decoded, offsets = encoding.decode_with_offsets(tokens)
+    offsets.append(len(decoded))
+    start = 0
+    while start < len(tokens):
+        end = min(start + max_tokens, len(tokens))
+        # Tokens sharing an offset are bytes of one character; cut before it
+        while start + 1 < end < len(tokens) and offsets[end] == offsets[end - 1]:
+            end -= 1
+        piece = decoded[offsets[start]:offsets[end]]
+        if piece:
+            yield piece, count_tokens(piece, model)
+        start = end
+
+
+def count_message_tokens(messages: list, model: str) -> int:
+    return TOKENS_PER_REPLY + sum(
+        TOKENS_PER_MESSAGE + count_tokens(message["content"], model) for message in messages
+    )
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """
+    Keeps the first `max_tokens` tokens of `text`.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def max_output_tokens(model: str) -> int:
+    return MODEL_MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS)
+
+
+def budget_chat_request(
+    model: str,
+    system_prompt: str,
+    prompt: str,
+    max_completion_tokens: int,
+    overflow_strategy: str = "truncate",
+    auto_max_tokens: bool = False,
+) -> dict:
+    """
+    Fits a system + user prompt into the model's context window.
+
+    `max_completion_tokens` is the room reserved for the reply. If the
+    prompt leaves less than that, the user prompt is cut down to fit
+    ("truncate") or ContextWindowExceeded is raised ("reject"). With
+    `auto_max_tokens` the reply gets all remaining room (capped at the
+    model's output limit), with `max_completion_tokens` as the minimum.
+
+    Returns a dict with the (possibly truncated) prompt, the token counts
+    and the max_completion_tokens to send.
+    """
+    window = context_window(model)
+    reserved = min(max_completion_tokens, max_output_tokens(model))
+
+    system_tokens = count_tokens(system_prompt, model)
+    prompt_tokens = count_tokens(prompt, model)
+    overhead = TOKENS_PER_REPLY + 2 * TOKENS_PER_MESSAGE
+    input_tokens = overhead + system_tokens + prompt_tokens
+
+    truncated = False
+    if input_tokens + reserved > window:
+        if overflow_strategy == "reject":
+            raise ContextWindowExceeded(
+                f"Prompt is {input_tokens} tokens; with {reserved} reserved for the reply "
+                f"it exceeds the {window}-token context window of {model}"
+            )
+
+        allowed = window - reserved - overhead - system_tokens
+        if allowed <= 0:
+            raise ContextWindowExceeded(
+                f"System prompt alone ({system_tokens} tokens) leaves no room in the "
+                f"{window}-token context window of {model}"
+            )
+        prompt = truncate_to_tokens(prompt, allowed, model)
+        prompt_tokens = count_tokens(prompt, model)
+        input_tokens = overhead + system_tokens + prompt_tokens
+        truncated = True
+        logger.warning(f"Truncated prompt to {prompt_tokens} tokens to fit {model}'s context window")
+
+    if auto_max_tokens:
+        completion_tokens = max(reserved, min(max_output_tokens(model), window - input_tokens))
+    else:
+        completion_tokens = max_completion_tokens
+
+    return {
+        "prompt": prompt,
+        "system_tokens": system_tokens,
+        "prompt_tokens": prompt_tokens,
+        "input_tokens": input_tokens,
+        "max_completion_tokens": completion_tokens,
+        "truncated": truncated,
+    }
@@ -1,21 +1,30 @@
 import os
-from openai import OpenAI
+from ..common.metrics import log_sampled, record_bytes, record_error, timed
+from ..common.batch_jobs import run_batch_job
+from ..common.embedder import embed_texts
+from ..common.embeddings import EMBEDDING_TYPE, embedding_to_base64
+from ..common.inputs import parse_prompt_list
+from ..common.openai_client import get_openai_client
 import json
 import logging
-import dotenv
 
-dotenv.load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 OPENAI_MODELS = [
     "text-embedding-3-small",
     "text-embedding-3-large",
-    "text-embedding-3-large"
+    "text-embedding-ada-002",
 ]
 
 class OpenAIEmbedding:
+    """
+    Embeds `input_text` (or, with `batch_input`, a JSON array / one text
+    per line). `response` is the embedding as a list of floats, as before
+    (one list per text with `batch_input`); `embedding` is the same as an
+    EMBEDDING matrix with one float32 row per text, which the Astra DB
+    nodes accept, and `embedding_b64` is that matrix base64-encoded.
+    `dimensions` shortens text-embedding-3 vectors; 0 keeps the model default.
+    """
 
     @classmethod
     def INPUT_TYPES(s):
@@ -23,37 +32,101 @@ class OpenAIEmbedding:
             "required": {
                 "model": (OPENAI_MODELS, ),
                 "input_text": ("STRING", {"multiline": True}),
+            },
+            "optional": {
+                "batch_input": ("BOOLEAN", {"default": False}),
+                "dimensions": ("INT", {"default": 0, "min": 0, "max": 3072}),
+                "use_cache": ("BOOLEAN", {"default": True}),
             }
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("response",)
+    RETURN_TYPES = ("STRING", EMBEDDING_TYPE, "STRING")
+    RETURN_NAMES = ("response", "embedding", "embedding_b64")
     FUNCTION = "api_call"
     CATEGORY = "embedding"
 
-    def api_call(self, model, input_text):
+    @timed("openai_embedding")
+    def api_call(self, model, input_text, batch_input=False, dimensions=0, use_cache=True):
         openai_api_key = os.environ.get("OPENAI_API_KEY")
         
         if not openai_api_key:
             logger.info("OpenAI API key not set")
-            return "OpenAI API key not set"
-        
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-        )
+            return ("OpenAI API key not set", None, None)
+
+        texts = parse_prompt_list(input_text) if batch_input else [input_text]
+        if not texts:
+            return ("No text to embed", None, None)
         
         try:
-            response = client.embeddings.create(
-                input=input_text,
-                model=model,
-            )
-            
-            logger.info(response)           
-            full_response = response.data[0].embedding
-                
-            logger.info(full_response)
-            return (full_response, )
+            matrix = embed_texts(openai_api_key, model, texts, dimensions, node="openai_embedding", use_cache=use_cache)
+            record_bytes("openai_embedding", matrix.nbytes)
+            log_sampled(logger, "OpenAI embeddings with shape %s", matrix.shape)
+            response = matrix.tolist() if batch_input else matrix[0].tolist()
+            return (response, matrix, embedding_to_base64(matrix))
         except Exception as e:
             error_msg = f"Error during API call: {str(e)}"
             logger.error(error_msg)
-            return (error_msg, )
\ No newline at end of file
+            record_error("openai_embedding")
+            return (error_msg, None, None)
+
+class OpenAIEmbeddingBatchJob:
+    """
+    Embeds many texts (a JSON array or one per line) through the OpenAI
+    Batch API. Returns a JSON array of embeddings in input order, with null
+    for any text that failed; see `status` for the batch state. While the
+    batch is still running the embeddings output is empty and re-running
+    the workflow resumes the same batch.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "model": (OPENAI_MODELS, ),
+                "input_texts": ("STRING", {"multiline": True}),
+                "max_wait_seconds": ("INT", {"default": 600, "min": 0, "max": 86400}),
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        # Always re-run so a pending batch is polled again
+        return float("nan")
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("embeddings", "status")
+    FUNCTION = "run_batch"
+    CATEGORY = "embedding"
+
+    @timed("openai_embedding_batch_job")
+    def run_batch(self, model, input_texts, max_wait_seconds):
+        texts = parse_prompt_list(input_texts)
+        if not texts:
+            return (json.dumps([]), None)
+
+        openai_api_key = os.environ.get("OPENAI_API_KEY")
+
+        if not openai_api_key:
+            logger.info("OpenAI API key not set")
+            return ("OpenAI API key not set", None)
+
+        bodies = [{"model": model, "input": text} for text in texts]
+
+        client = get_openai_client(openai_api_key)
+        try:
+            state, results = run_batch_job(client, "/v1/embeddings", bodies, max_wait_seconds)
+        except Exception as e:
+            error_msg = f"Error during batch job: {str(e)}"
+            logger.error(error_msg)
+            record_error("openai_embedding_batch_job")
+            return (error_msg, None)
+
+        if results is None:
+            logger.info(f"OpenAI batch {state['batch_id']} is {state['status']}")
+            return (json.dumps([]), json.dumps(state))
+
+        embeddings = [
+            result["body"]["data"][0]["embedding"] if result["error"] is None else None
+            for result in results
+        ]
+        return (json.dumps(embeddings), json.dumps(state))
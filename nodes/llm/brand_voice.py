@@ -1,11 +1,14 @@
 import os
-from openai import OpenAI
+import json
+import asyncio
+from ..common.metrics import log_sampled, record_error, record_usage, timed
+from ..common.concurrency import run_sync
+from ..common.inputs import parse_prompt_list
+from ..common.scheduler import get_scheduler
+from ..common.openai_client import get_openai_client, get_async_openai_client
+from ..common.tokens import OVERFLOW_STRATEGIES, ContextWindowExceeded, budget_chat_request
 import logging
-import dotenv
 
-dotenv.load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 OPENAI_MODELS = [
@@ -88,6 +91,46 @@ BRAND_VOICES = [
   "Genuine",
 ]
 
+# The instructions never change, so they are sent byte-identical on every
+# call and come first; the provider's automatic prompt-prefix caching can
+# then reuse them. The variable parts (text, then voice) go in the user
+# message, text first so rewriting one text into several voices also
+# shares the text as part of the cached prefix.
+SYSTEM_PROMPT = (
+    "You are a highly skilled language model specialized in adjusting tones and voices of content. "
+    "Your task is to reformat and rewrite the provided text in a clear, coherent, and engaging way "
+    "that aligns with the specified brand voice. Ensure that the restructured text stays true to the "
+    "original message while reflecting the desired tone.\n"
+    "\n"
+    "Guidelines:\n"
+    "- Respect the structure and key points of the original text.\n"
+    "- Use vocabulary, phrasing, and sentence style that align with the chosen voice.\n"
+    "- Make the tone consistent throughout the response.\n"
+    "\n"
+    "The user message contains the text to reformat, followed by the brand voice to apply. "
+    "Reply with the reformatted text only."
+)
+
+
+def voice_suffix(brand_voice):
+    return f"\n\nBrand Voice: {brand_voice}"
+
+
+def build_messages(brand_voice, text):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Text to reformat:\n{text}{voice_suffix(brand_voice)}"},
+    ]
+
+
+def parse_brand_voices(brand_voices):
+    """
+    Accepts brand voice names separated by commas or newlines.
+    """
+    voices = [voice.strip() for line in (brand_voices or "").splitlines() for voice in line.split(",")]
+    return [voice for voice in voices if voice]
+
+
 class OpenAIBrandVoiceReformatter:
     @classmethod
     def INPUT_TYPES(s):
@@ -98,61 +141,166 @@ class OpenAIBrandVoiceReformatter:
                 "prompt": ("STRING", {"multiline": True}),
                 "temperature": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 2.0, "step": 0.01}),
                 "max_completion_tokens": ("INT", {"default": 100, "min": 0, "max": 4000}),
+            },
+            "optional": {
+                "overflow_strategy": (OVERFLOW_STRATEGIES, ),
+                "auto_max_tokens": ("BOOLEAN", {"default": False}),
             }
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("response",)
+    RETURN_TYPES = ("STRING", "INT", "INT")
+    RETURN_NAMES = ("response", "input_tokens", "max_completion_tokens")
     FUNCTION = "api_call"
     CATEGORY = "llm"
 
-    def api_call(self, model, brand_voice, prompt, temperature, max_completion_tokens):
+    @timed("openai_brand_voice_reformatter")
+    def api_call(self, model, brand_voice, prompt, temperature, max_completion_tokens, overflow_strategy="truncate", auto_max_tokens=False):
         if prompt == "" or prompt == "exit" or prompt == None:
-            return (None, )
+            return (None, 0, 0)
         
         openai_api_key = os.environ.get("OPENAI_API_KEY")
         
         if not openai_api_key:
             logger.info("OpenAI API key not set")
-            return "OpenAI API key not set"
+            return ("OpenAI API key not set", 0, 0)
         
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-        )
+        client = get_openai_client(openai_api_key, max_retries=0)
         
-        system_prompt = f"""
-          You are a highly skilled language model specialized in adjusting tones and voices of content. Your task is to reformat and rewrite the provided text in a clear, coherent, and engaging way that aligns with the specified brand voice. Ensure that the restructured text stays true to the original message while reflecting the desired tone. 
-
-          Brand Voice: {brand_voice}
+        try:
+            # Budget the voice line with the fixed part so truncation only
+            # ever cuts the text, never the voice that follows it.
+            budget = budget_chat_request(model, SYSTEM_PROMPT + voice_suffix(brand_voice), prompt, max_completion_tokens, overflow_strategy, auto_max_tokens)
+        except ContextWindowExceeded as e:
+            logger.error(str(e))
+            return (str(e), 0, 0)
 
-          Guidelines:
-          - Respect the structure and key points of the original text.
-          - Use vocabulary, phrasing, and sentence style that align with the chosen voice.
-          - Make the tone consistent throughout the response.
+        input_tokens = budget["input_tokens"]
+        completion_tokens = budget["max_completion_tokens"]
 
-          Reformat the following text:
-        """
-        
         try:
-            response = client.chat.completions.create(
+            response = get_scheduler().call(
+                lambda: client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=build_messages(brand_voice, budget["prompt"]),
+                    response_format={
+                      "type": "text"
+                    },
+                    temperature=temperature,
+                    max_completion_tokens=completion_tokens,
+                ),
+                api_key=openai_api_key,
                 model=model,
-                messages=[
-                  {"role": "system", "content": system_prompt},
-                  {"role": "user", "content": prompt}
-                ],
-                response_format={
-                  "type": "text"
-                },
-                temperature=temperature,
-                max_completion_tokens=max_completion_tokens,
+                estimated_tokens=input_tokens + completion_tokens,
             )
             
-            logger.info(response)           
+            record_usage("openai_brand_voice_reformatter", response.usage)
+            log_sampled(logger, "OpenAI response: %s", response)
             full_response = response.choices[0].message.content.strip()
                 
-            logger.info(full_response)
-            return (full_response, )
+            return (full_response, input_tokens, completion_tokens)
         except Exception as e:
             error_msg = f"Error during API call: {str(e)}"
             logger.error(error_msg)
-            return (error_msg, )
\ No newline at end of file
+            record_error("openai_brand_voice_reformatter")
+            return (error_msg, input_tokens, completion_tokens)
+
+
+class OpenAIBrandVoiceBatchReformatter:
+    """
+    Rewrites every text into every listed brand voice in one execution,
+    dispatching the requests concurrently. Use one text with several voices
+    for multi-voice variants, or several texts with one voice.
+
+    `texts` is a JSON array or one text per line; `brand_voices` is a comma
+    or newline separated list. Returns a JSON array of
+    {"text_index", "brand_voice", "response", "error"} objects, ordered by
+    text and then by voice.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "model": (OPENAI_MODELS, ),
+                "brand_voices": ("STRING", {"default": "Professional, Friendly", "multiline": True}),
+                "texts": ("STRING", {"multiline": True}),
+                "temperature": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 2.0, "step": 0.01}),
+                "max_completion_tokens": ("INT", {"default": 100, "min": 0, "max": 4000}),
+                "concurrency": ("INT", {"default": 8, "min": 1, "max": 64}),
+            },
+            "optional": {
+                "overflow_strategy": (OVERFLOW_STRATEGIES, ),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("responses",)
+    FUNCTION = "api_call"
+    CATEGORY = "llm"
+
+    @timed("openai_brand_voice_batch_reformatter")
+    def api_call(self, model, brand_voices, texts, temperature, max_completion_tokens, concurrency, overflow_strategy="truncate"):
+        text_list = parse_prompt_list(texts)
+        voices = parse_brand_voices(brand_voices)
+        if not text_list or not voices:
+            return (json.dumps([]), )
+
+        unknown = [voice for voice in voices if voice not in BRAND_VOICES]
+        if unknown:
+            logger.warning(f"Using brand voices that are not in BRAND_VOICES: {unknown}")
+
+        openai_api_key = os.environ.get("OPENAI_API_KEY")
+
+        if not openai_api_key:
+            logger.info("OpenAI API key not set")
+            return ("OpenAI API key not set", )
+
+        jobs = []
+        for text_index, text in enumerate(text_list):
+            for voice in voices:
+                job = {"text_index": text_index, "brand_voice": voice, "response": None, "error": None}
+                try:
+                    job["budget"] = budget_chat_request(model, SYSTEM_PROMPT + voice_suffix(voice), text, max_completion_tokens, overflow_strategy)
+                except ContextWindowExceeded as e:
+                    job["error"] = str(e)
+                jobs.append(job)
+
+        client = get_async_openai_client(openai_api_key, max_retries=0)
+        run_sync(self._run_batch(client, openai_api_key, model, temperature, jobs, concurrency))
+
+        for job in jobs:
+            job.pop("budget", None)
+        failed = sum(1 for job in jobs if job["error"] is not None)
+        logger.info(f"Brand voice batch finished: {len(jobs) - failed} succeeded, {failed} failed")
+        return (json.dumps(jobs), )
+
+    async def _run_batch(self, client, api_key, model, temperature, jobs, concurrency):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        scheduler = get_scheduler()
+
+        async def run_one(job):
+            budget = job["budget"]
+            async with semaphore:
+                try:
+                    response = await scheduler.acall(
+                        lambda: client.chat.completions.with_raw_response.create(
+                            model=model,
+                            messages=build_messages(job["brand_voice"], budget["prompt"]),
+                            response_format={
+                              "type": "text"
+                            },
+                            temperature=temperature,
+                            max_completion_tokens=budget["max_completion_tokens"],
+                        ),
+                        api_key=api_key,
+                        model=model,
+                        estimated_tokens=budget["input_tokens"] + budget["max_completion_tokens"],
+                    )
+                    record_usage("openai_brand_voice_batch_reformatter", response.usage)
+                    job["response"] = response.choices[0].message.content.strip()
+                except Exception as e:
+                    job["error"] = f"Error during API call: {str(e)}"
+                    logger.error(job["error"])
+                    record_error("openai_brand_voice_batch_reformatter")
+
+        await asyncio.gather(*(run_one(job) for job in jobs if job["error"] is None))
@@ -21,17 +21,36 @@ Available Ollama API Options (options passed to the model):
 - use_mmap: Use memory mapping (bool)
 - num_thread: Number of threads (int)
 
+With `stream` enabled the node reads Ollama's NDJSON chunks as they arrive,
+pushes the partial text to the ComfyUI frontend, and closes the connection
+as soon as a stop sequence or `max_characters` is reached so Ollama aborts
+the generation and frees the GPU. The `stats` output reports
+time-to-first-token and tokens/second for every call.
+
+Requests go through a pooled session per Ollama host, and the `keep_alive`
+input controls how long Ollama keeps the model loaded afterwards. The
+`stats` output's `model_load` field says whether the call hit an already
+loaded model ("warm") or paid for loading it ("cold"). Set
+`FLOWSCALE_OLLAMA_PREWARM=import` to preload OLLAMA_MODELS when the package
+is imported, or `first_use` to load just the requested model before its
+first generation on each host (never other models, which on a single GPU
+could evict the one serving the request).
+
 This node includes the most commonly used options. For full documentation, see:
 https://github.com/ollama/ollama/blob/main/docs/api.md
 """
 
+import os
+import json
+import time
 import logging
+import threading
 import requests
-import dotenv
 
-dotenv.load_dotenv()
+from ..common.metrics import log_sampled, record_bytes, record_error, record_tokens, timed
+from ..common.http_session import endpoint_origin, get_session
+from ..common.response_cache import get_response_cache, make_cache_key
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 OLLAMA_MODELS = [
@@ -41,6 +60,151 @@ OLLAMA_MODELS = [
     # "gpt-oss:latest",
 ]
 
+# Minimum seconds between partial-text pushes to the frontend while streaming
+STREAM_PROGRESS_INTERVAL = 0.25
+
+DEFAULT_API_ENDPOINT = os.environ.get("OLLAMA_API_ENDPOINT", "http://localhost:11434/api/generate")
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "5m")
+PREWARM_MODE = os.environ.get("FLOWSCALE_OLLAMA_PREWARM", "").lower()
+# A load_duration above this many seconds means the model was not resident
+COLD_LOAD_THRESHOLD = float(os.environ.get("FLOWSCALE_OLLAMA_COLD_LOAD_SECONDS", "0.5"))
+
+# (Ollama host, model) pairs already pre-warmed by this process
+_prewarmed = set()
+_prewarm_lock = threading.Lock()
+
+
+def parse_keep_alive(keep_alive):
+    """
+    Ollama accepts either a duration string ("5m", "1h") or a number of
+    seconds, where a negative number keeps the model loaded indefinitely.
+    """
+    keep_alive = (keep_alive or "").strip()
+    if not keep_alive:
+        return DEFAULT_KEEP_ALIVE
+    try:
+        return int(keep_alive)
+    except ValueError:
+        return keep_alive
+
+
+def prewarm_models(api_endpoint=DEFAULT_API_ENDPOINT, models=None, keep_alive=DEFAULT_KEEP_ALIVE):
+    """
+    Loads each model into Ollama's memory without generating anything
+    (a request with no prompt only loads the model). `models` defaults to
+    OLLAMA_MODELS; an empty list does nothing.
+    """
+    models = OLLAMA_MODELS if models is None else models
+    if not models:
+        return
+    session = get_session(api_endpoint)
+    for model in models:
+        try:
+            started = time.perf_counter()
+            response = session.post(
+                api_endpoint,
+                json={"model": model, "keep_alive": parse_keep_alive(keep_alive)},
+                timeout=300,
+            )
+            response.raise_for_status()
+            logger.info(f"Pre-warmed Ollama model {model} in {time.perf_counter() - started:.2f}s")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to pre-warm Ollama model {model}: {e}")
+
+
+def claim_prewarm(api_endpoint, models):
+    """
+    Returns the models not yet pre-warmed on this Ollama host, and marks
+    them as pre-warmed.
+    """
+    origin = endpoint_origin(api_endpoint)
+    with _prewarm_lock:
+        pending = [model for model in models if (origin, model) not in _prewarmed]
+        _prewarmed.update((origin, model) for model in pending)
+    return pending
+
+
+def prewarm_in_background(api_endpoint=DEFAULT_API_ENDPOINT, models=None, keep_alive=DEFAULT_KEEP_ALIVE):
+    """
+    Starts `prewarm_models` on a daemon thread for the models not yet
+    pre-warmed on this Ollama host.
+    """
+    models = claim_prewarm(api_endpoint, OLLAMA_MODELS if models is None else models)
+    if not models:
+        return
+
+    threading.Thread(
+        target=prewarm_models,
+        args=(api_endpoint, models, keep_alive),
+        name="flowscale-ollama-prewarm",
+        daemon=True,
+    ).start()
+
+
+def parse_stop_sequences(stop_sequences):
+    """
+    Stop sequences are entered one per line; escaped newlines (\\n) are
+    unescaped so a sequence can itself contain a line break.
+    """
+    if not stop_sequences:
+        return []
+    return [line.replace("\\n", "\n") for line in stop_sequences.splitlines() if line]
+
+
+def send_stream_progress(unique_id, text):
+    """
+    Shows partial output on the node in the ComfyUI frontend, if the
+    server is available (it is not when the node runs outside ComfyUI).
+    """
+    if unique_id is None:
+        return
+    try:
+        from server import PromptServer
+    except ImportError:
+        return
+
+    server = PromptServer.instance
+    try:
+        if hasattr(server, "send_progress_text"):
+            server.send_progress_text(text, unique_id)
+        else:
+            server.send_sync("flowscale.llm.stream", {"node": unique_id, "text": text})
+    except Exception:
+        logger.debug("Failed to push stream progress", exc_info=True)
+
+
+def generation_stats(final_chunk, started, first_token_at, finished, chunk_count, stop_reason):
+    """
+    Builds timing stats for a generation. Ollama reports eval_count and
+    eval_duration (nanoseconds) on its final chunk; when the stream is cut
+    short there is no final chunk, so throughput is estimated from the
+    number of streamed chunks (one token each) instead.
+    """
+    stats = {
+        "stop_reason": stop_reason,
+        "total_seconds": round(finished - started, 4),
+        "time_to_first_token": round(first_token_at - started, 4) if first_token_at else None,
+    }
+
+    eval_count = final_chunk.get("eval_count")
+    eval_duration = final_chunk.get("eval_duration")
+    if eval_count and eval_duration:
+        stats["eval_count"] = eval_count
+        stats["tokens_per_second"] = round(eval_count / (eval_duration / 1e9), 2)
+    elif chunk_count and first_token_at and finished > first_token_at:
+        stats["eval_count"] = chunk_count
+        stats["tokens_per_second"] = round(chunk_count / (finished - first_token_at), 2)
+
+    if final_chunk.get("prompt_eval_count") is not None:
+        stats["prompt_eval_count"] = final_chunk["prompt_eval_count"]
+
+    load_duration = final_chunk.get("load_duration")
+    if load_duration is not None:
+        stats["load_seconds"] = round(load_duration / 1e9, 4)
+        stats["model_load"] = "cold" if load_duration / 1e9 > COLD_LOAD_THRESHOLD else "warm"
+    return stats
+
+
 class OllamaAPI:
     """
     A node for calling Ollama API to generate LLM responses.
@@ -50,7 +214,7 @@ class OllamaAPI:
     def INPUT_TYPES(cls):
         return {
             "required": {
-                "api_endpoint": ("STRING", {"default": "http://localhost:11434/api/generate"}),
+                "api_endpoint": ("STRING", {"default": DEFAULT_API_ENDPOINT}),
                 "model": (OLLAMA_MODELS, ),
                 "prompt": ("STRING", {"multiline": True}),
                 "response_format": (["text", "json"], ),
@@ -62,14 +226,67 @@ class OllamaAPI:
                 "top_k": ("INT", {"default": 20, "min": 0, "max": 100}),
                 "top_p": ("FLOAT", {"default": 0.9, "min": 0.0, "max": 1.0, "step": 0.01}),
                 "repeat_penalty": ("FLOAT", {"default": 1.1, "min": 0.0, "max": 2.0, "step": 0.01}),
+                "use_cache": ("BOOLEAN", {"default": True}),
+                "stream": ("BOOLEAN", {"default": False}),
+                "stop_sequences": ("STRING", {"default": "", "multiline": True}),
+                "max_characters": ("INT", {"default": 0, "min": 0, "max": 1000000}),
+                "keep_alive": ("STRING", {"default": DEFAULT_KEEP_ALIVE}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             }
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("response",)
+    @classmethod
+    def IS_CHANGED(
+        cls,
+        api_endpoint,
+        model,
+        prompt,
+        response_format,
+        temperature,
+        system_prompt="",
+        seed=42,
+        top_k=20,
+        top_p=0.9,
+        repeat_penalty=1.1,
+        use_cache=True,
+        stream=False,
+        stop_sequences="",
+        max_characters=0,
+        **kwargs,
+    ):
+        # A stable key lets ComfyUI skip re-execution of unchanged inputs,
+        # with or without the response cache
+        return cls._cache_key(api_endpoint, model, prompt, response_format, temperature, system_prompt, seed, top_k, top_p, repeat_penalty, stop_sequences, max_characters)
+
+    @staticmethod
+    def _cache_key(api_endpoint, model, prompt, response_format, temperature, system_prompt, seed, top_k, top_p, repeat_penalty, stop_sequences="", max_characters=0):
+        return make_cache_key(
+            "ollama.generate",
+            # Different servers may serve different weights under one name
+            api_endpoint=api_endpoint,
+            model=model,
+            prompt=prompt,
+            system=system_prompt.strip() if system_prompt else "",
+            response_format=response_format,
+            options={
+                "seed": seed,
+                "top_k": top_k,
+                "top_p": top_p,
+                "temperature": temperature,
+                "repeat_penalty": repeat_penalty,
+                "stop": parse_stop_sequences(stop_sequences),
+            },
+            max_characters=max_characters,
+        )
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("response", "stats")
     FUNCTION = "api_call"
     CATEGORY = "llm"
 
+    @timed("llm_generate")
     def api_call(
         self,
         api_endpoint,
@@ -82,15 +299,38 @@ class OllamaAPI:
         top_k=20,
         top_p=0.9,
         repeat_penalty=1.1,
+        use_cache=True,
+        stream=False,
+        stop_sequences="",
+        max_characters=0,
+        keep_alive=DEFAULT_KEEP_ALIVE,
+        unique_id=None,
     ):
         if not prompt or prompt.strip() == "" or prompt == "exit":
-            return (None, )
+            return (None, None)
+
+        cache = get_response_cache() if use_cache else None
+        cache_key = None
+        if cache is not None:
+            cache_key = self._cache_key(api_endpoint, model, prompt, response_format, temperature, system_prompt, seed, top_k, top_p, repeat_penalty, stop_sequences, max_characters)
+            cached_response = cache.get(cache_key)
+            if cached_response is not None:
+                logger.info("Returning cached Ollama response")
+                return (cached_response, json.dumps({"stop_reason": "cached"}))
+
+        if PREWARM_MODE == "first_use":
+            # Load only the requested model, and before generating, so the
+            # load never competes with a running generation for the GPU
+            prewarm_models(api_endpoint, claim_prewarm(api_endpoint, [model]), keep_alive)
+
+        stops = parse_stop_sequences(stop_sequences)
 
         # Build the request payload
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False,
+            "stream": bool(stream),
+            "keep_alive": parse_keep_alive(keep_alive),
             "options": {
                 "seed": seed,
                 "top_k": top_k,
@@ -100,6 +340,11 @@ class OllamaAPI:
             }
         }
 
+        # Ollama applies stop sequences server-side too; the client-side
+        # check while streaming only lets us cut the connection sooner.
+        if stops:
+            payload["options"]["stop"] = stops
+
         # Add system prompt if provided
         if system_prompt and system_prompt.strip():
             payload["system"] = system_prompt
@@ -109,40 +354,149 @@ class OllamaAPI:
             payload["format"] = "json"
 
         try:
-            logger.info(f"Calling Ollama API at {api_endpoint} with model {model}")
-
-            response = requests.post(
-                api_endpoint,
-                headers={"Content-Type": "application/json"},
-                json=payload,
-                timeout=300  # 5 minute timeout for long responses
-            )
+            logger.debug("Calling Ollama API at %s with model %s", api_endpoint, model)
 
-            response.raise_for_status()
-            response_data = response.json()
+            if stream:
+                full_response, stats = self._generate_streaming(api_endpoint, payload, stops, max_characters, unique_id)
+            else:
+                full_response, stats = self._generate_blocking(api_endpoint, payload, max_characters)
 
-            logger.info(f"Ollama response received: {response_data}")
+            full_response = full_response.strip()
 
-            # Extract the response text
-            full_response = response_data.get("response", "").strip()
+            record_tokens("llm_generate", stats.get("prompt_eval_count", 0), stats.get("eval_count", 0))
 
             if not full_response:
                 error_msg = "No response received from Ollama API"
                 logger.error(error_msg)
-                return (error_msg, )
+                record_error("llm_generate")
+                return (error_msg, json.dumps(stats))
 
-            logger.info(f"Ollama response: {full_response}")
-            return (full_response, )
+            record_bytes("llm_generate", len(full_response))
+            log_sampled(logger, "Ollama response: %s", full_response)
+            logger.debug("Ollama generation stats: %s", stats)
+            if cache_key is not None:
+                cache.put(cache_key, full_response)
+            return (full_response, json.dumps(stats))
 
         except requests.exceptions.Timeout:
             error_msg = "Request to Ollama API timed out"
             logger.error(error_msg)
-            return (error_msg, )
+            record_error("llm_generate")
+            return (error_msg, None)
         except requests.exceptions.RequestException as e:
             error_msg = f"Error during Ollama API call: {str(e)}"
             logger.error(error_msg)
-            return (error_msg, )
+            record_error("llm_generate")
+            return (error_msg, None)
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
             logger.error(error_msg)
-            return (error_msg, )
+            record_error("llm_generate")
+            return (error_msg, None)
+
+    def _generate_blocking(self, api_endpoint, payload, max_characters):
+        started = time.perf_counter()
+        response = get_session(api_endpoint).post(
+            api_endpoint,
+            headers={"Content-Type": "application/json"},
+            json=payload,
+            timeout=300  # 5 minute timeout for long responses
+        )
+
+        response.raise_for_status()
+        response_data = response.json()
+        finished = time.perf_counter()
+
+        log_sampled(logger, "Ollama response received: %s", response_data)
+
+        # Extract the response text
+        text = response_data.get("response", "")
+        stop_reason = response_data.get("done_reason") or "done"
+        if max_characters and len(text) > max_characters:
+            text = text[:max_characters]
+            stop_reason = "max_characters"
+
+        return text, generation_stats(response_data, started, None, finished, 0, stop_reason)
+
+    def _generate_streaming(self, api_endpoint, payload, stops, max_characters, unique_id):
+        """
+        Consumes Ollama's NDJSON stream incrementally. Leaving the `with`
+        block early closes the connection, which makes Ollama cancel the
+        rest of the generation.
+        """
+        started = time.perf_counter()
+        first_token_at = None
+        last_progress_at = 0.0
+        final_chunk = {}
+        stop_reason = "done"
+
+        parts = []
+        length = 0
+        chunk_count = 0
+        cut_at = None
+        # Only the last few characters can complete a stop sequence, so
+        # search a bounded tail instead of the whole text on every chunk.
+        tail = ""
+        tail_size = max((len(stop) for stop in stops), default=0)
+
+        with get_session(api_endpoint).post(
+            api_endpoint,
+            headers={"Content-Type": "application/json"},
+            json=payload,
+            stream=True,
+            timeout=(10, 300),  # connect timeout, then max seconds between chunks
+        ) as response:
+            response.raise_for_status()
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+
+                piece = chunk.get("response", "")
+                if piece:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    chunk_count += 1
+                    parts.append(piece)
+                    length += len(piece)
+
+                    if stops:
+                        window = tail + piece
+                        hits = [window.find(stop) for stop in stops]
+                        hits = [hit for hit in hits if hit >= 0]
+                        if hits:
+                            cut_at = length - len(window) + min(hits)
+                            stop_reason = "stop_sequence"
+                            break
+                        tail = window[-tail_size:]
+
+                    if max_characters and length >= max_characters:
+                        cut_at = max_characters
+                        stop_reason = "max_characters"
+                        break
+
+                    now = time.perf_counter()
+                    if now - last_progress_at >= STREAM_PROGRESS_INTERVAL:
+                        send_stream_progress(unique_id, "".join(parts))
+                        last_progress_at = now
+
+                if chunk.get("done"):
+                    final_chunk = chunk
+                    stop_reason = chunk.get("done_reason") or "done"
+                    break
+
+        finished = time.perf_counter()
+        text = "".join(parts)
+        if cut_at is not None:
+            text = text[:cut_at]
+
+        send_stream_progress(unique_id, text)
+        return text, generation_stats(final_chunk, started, first_token_at, finished, chunk_count, stop_reason)
+
+
+if PREWARM_MODE == "import":
+    prewarm_in_background()
@@ -1,12 +1,16 @@
 import os
-from openai import OpenAI
+import asyncio
+from ..common.metrics import log_sampled, record_error, record_usage, timed
+from ..common.concurrency import run_sync
+from ..common.inputs import parse_prompt_list
+from ..common.scheduler import estimate_request_tokens, get_scheduler
+from ..common.openai_client import account_id, get_openai_client, get_async_openai_client
+from ..common.chat_cache import OpenAIChatCaching
+from ..common.response_cache import get_response_cache
+from ..common.tokens import OVERFLOW_STRATEGIES, ContextWindowExceeded, budget_chat_request
 import json
 import logging
-import dotenv
 
-dotenv.load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 OPENAI_MODELS = [
@@ -21,7 +25,7 @@ OPENAI_MODELS = [
     "o1-preview",
 ]
 
-class OpenAIAPI:
+class OpenAIAPI(OpenAIChatCaching):
 
     @classmethod
     def INPUT_TYPES(s):
@@ -36,51 +40,196 @@ class OpenAIAPI:
                 "max_completion_tokens": ("INT", {"default": 100, "min": 0, "max": 4000}),
                 "presence_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
                 "frequency_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
+            },
+            "optional": {
+                "use_cache": ("BOOLEAN", {"default": False}),
+                "overflow_strategy": (OVERFLOW_STRATEGIES, ),
+                "auto_max_tokens": ("BOOLEAN", {"default": False}),
             }
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("response",)
+    RETURN_TYPES = ("STRING", "INT", "INT")
+    RETURN_NAMES = ("response", "input_tokens", "max_completion_tokens")
     FUNCTION = "api_call"
     CATEGORY = "llm"
 
-    def api_call(self, model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty):
+    @timed("openai")
+    def api_call(self, model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, use_cache=False, overflow_strategy="truncate", auto_max_tokens=False):
         if prompt == "" or prompt == "exit" or prompt == None:
-            return (None, )
+            return (None, 0, 0)
         
         openai_api_key = os.environ.get("OPENAI_API_KEY")
         
         if not openai_api_key:
             logger.info("OpenAI API key not set")
-            return "OpenAI API key not set"
+            return ("OpenAI API key not set", 0, 0)
         
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-        )
+        try:
+            budget = budget_chat_request(model, system_prompt, prompt, max_completion_tokens, overflow_strategy, auto_max_tokens)
+        except ContextWindowExceeded as e:
+            logger.error(str(e))
+            return (str(e), 0, 0)
+
+        input_tokens = budget["input_tokens"]
+        completion_tokens = budget["max_completion_tokens"]
+
+        client = get_openai_client(openai_api_key, max_retries=0)
+
+        cache = get_response_cache() if use_cache else None
+        cache_key = None
+        if cache is not None:
+            cache_key = self._cache_key(model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, overflow_strategy, auto_max_tokens, account_id(client))
+            cached_response = cache.get(cache_key)
+            if cached_response is not None:
+                logger.info("Returning cached OpenAI response")
+                return (cached_response, input_tokens, completion_tokens)
         
         try:
-            response = client.chat.completions.create(
+            response = get_scheduler().call(
+                lambda: client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=[
+                      {"role": "system", "content": system_prompt},
+                      {"role": "user", "content": budget["prompt"]}
+                    ],
+                    response_format={
+                      "type": response_format
+                    },
+                    temperature=temperature,
+                    top_p=top_p,
+                    max_completion_tokens=completion_tokens,
+                    presence_penalty=presence_penalty,
+                    frequency_penalty=frequency_penalty,
+                ),
+                api_key=openai_api_key,
                 model=model,
-                messages=[
-                  {"role": "system", "content": system_prompt},
-                  {"role": "user", "content": prompt}
-                ],
-                response_format={
-                  "type": response_format
-                },
-                temperature=temperature,
-                top_p=top_p,
-                max_completion_tokens=max_completion_tokens,
-                presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty,
+                estimated_tokens=input_tokens + completion_tokens,
             )
             
-            logger.info(response)           
+            record_usage("openai", response.usage)
+            log_sampled(logger, "OpenAI response: %s", response)
             full_response = response.choices[0].message.content.strip()
                 
-            logger.info(full_response)
-            return (full_response, )
+            if cache_key is not None:
+                cache.put(cache_key, full_response)
+            return (full_response, input_tokens, completion_tokens)
         except Exception as e:
             error_msg = f"Error during API call: {str(e)}"
             logger.error(error_msg)
-            return (error_msg, )
\ No newline at end of file
+            record_error("openai")
+            return (error_msg, input_tokens, completion_tokens)
+
+class OpenAIBatchAPI:
+    """
+    Fans a list of prompts out to OpenAI concurrently and returns a JSON
+    array of {"response", "error"} objects in input order. A failing prompt
+    only sets its own "error"; the rest of the batch still completes.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "model": (OPENAI_MODELS, ),
+                "system_prompt": ("STRING", {"default": "You are a helpful assistant.", "multiline": True}),
+                "prompts": ("STRING", {"multiline": True}),
+                "response_format": (["text", "json_object"], ),
+                "temperature": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 2.0, "step": 0.01}),
+                "top_p": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
+                "max_completion_tokens": ("INT", {"default": 100, "min": 0, "max": 4000}),
+                "presence_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
+                "frequency_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
+                "concurrency": ("INT", {"default": 8, "min": 1, "max": 64}),
+            },
+            "optional": {
+                "use_cache": ("BOOLEAN", {"default": False}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("responses",)
+    FUNCTION = "api_call"
+    CATEGORY = "llm"
+
+    @timed("openai_batch")
+    def api_call(self, model, system_prompt, prompts, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, concurrency, use_cache=False):
+        prompt_list = parse_prompt_list(prompts)
+        if not prompt_list:
+            return (json.dumps([]), )
+
+        openai_api_key = os.environ.get("OPENAI_API_KEY")
+
+        if not openai_api_key:
+            logger.info("OpenAI API key not set")
+            return ("OpenAI API key not set", )
+
+        params = {
+            "response_format": response_format,
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_completion_tokens": max_completion_tokens,
+            "presence_penalty": presence_penalty,
+            "frequency_penalty": frequency_penalty,
+        }
+
+        client = get_async_openai_client(openai_api_key, max_retries=0)
+        account = account_id(client)
+
+        cache = get_response_cache() if use_cache else None
+        results = [None] * len(prompt_list)
+        pending = []
+        for index, prompt in enumerate(prompt_list):
+            cache_key = OpenAIAPI._cache_key(model, system_prompt, prompt, account=account, **params) if cache is not None else None
+            cached_response = cache.get(cache_key) if cache_key is not None else None
+            if cached_response is not None:
+                results[index] = {"response": cached_response, "error": None}
+            else:
+                pending.append((index, prompt, cache_key))
+
+        if pending:
+            completed = run_sync(self._run_batch(client, openai_api_key, model, system_prompt, pending, concurrency, params))
+            for (index, _, cache_key), result in zip(pending, completed):
+                results[index] = result
+                if cache_key is not None and result["error"] is None:
+                    cache.put(cache_key, result["response"])
+
+        failed = sum(1 for result in results if result["error"] is not None)
+        logger.info(f"OpenAI batch finished: {len(results) - failed} succeeded, {failed} failed")
+        return (json.dumps(results), )
+
+    async def _run_batch(self, client, api_key, model, system_prompt, pending, concurrency, params):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        scheduler = get_scheduler()
+
+        async def run_one(prompt):
+            async with semaphore:
+                try:
+                    response = await scheduler.acall(
+                        lambda: client.chat.completions.with_raw_response.create(
+                            model=model,
+                            messages=[
+                              {"role": "system", "content": system_prompt},
+                              {"role": "user", "content": prompt}
+                            ],
+                            response_format={
+                              "type": params["response_format"]
+                            },
+                            temperature=params["temperature"],
+                            top_p=params["top_p"],
+                            max_completion_tokens=params["max_completion_tokens"],
+                            presence_penalty=params["presence_penalty"],
+                            frequency_penalty=params["frequency_penalty"],
+                        ),
+                        api_key=api_key,
+                        model=model,
+                        estimated_tokens=estimate_request_tokens(system_prompt + prompt, params["max_completion_tokens"]),
+                    )
+                    record_usage("openai_batch", response.usage)
+                    return {"response": response.choices[0].message.content.strip(), "error": None}
+                except Exception as e:
+                    error_msg = f"Error during API call: {str(e)}"
+                    logger.error(error_msg)
+                    record_error("openai_batch")
+                    return {"response": None, "error": error_msg}
+
+        return await asyncio.gather(*(run_one(prompt) for _, prompt, _ in pending))
@@ -0,0 +1,107 @@
+import os
+import json
+import logging
+
+from ..common.metrics import record_error, timed
+from ..common.batch_jobs import run_batch_job
+from ..common.inputs import parse_prompt_list
+from ..common.openai_client import get_openai_client
+from .openai import OPENAI_MODELS
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIBatchJob:
+    """
+    Runs a list of prompts through the OpenAI Batch API (half price, not
+    rate-limited against the synchronous quota, results within 24h).
+
+    The node waits up to `max_wait_seconds` for the batch. If it is still
+    running, `responses` is empty and `status` holds the batch state; queue
+    the workflow again later and the same inputs resume the same batch.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "model": (OPENAI_MODELS, ),
+                "system_prompt": ("STRING", {"default": "You are a helpful assistant.", "multiline": True}),
+                "prompts": ("STRING", {"multiline": True}),
+                "response_format": (["text", "json_object"], ),
+                "temperature": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 2.0, "step": 0.01}),
+                "top_p": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01}),
+                "max_completion_tokens": ("INT", {"default": 100, "min": 0, "max": 4000}),
+                "presence_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
+                "frequency_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
+                "max_wait_seconds": ("INT", {"default": 600, "min": 0, "max": 86400}),
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        # Always re-run so a pending batch is polled again; finished batches
+        # are answered from the results saved on disk.
+        return float("nan")
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("responses", "status")
+    FUNCTION = "run_batch"
+    CATEGORY = "llm"
+
+    @timed("openai_batch_job")
+    def run_batch(self, model, system_prompt, prompts, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, max_wait_seconds):
+        prompt_list = parse_prompt_list(prompts)
+        if not prompt_list:
+            return (json.dumps([]), None)
+
+        openai_api_key = os.environ.get("OPENAI_API_KEY")
+
+        if not openai_api_key:
+            logger.info("OpenAI API key not set")
+            return ("OpenAI API key not set", None)
+
+        bodies = [
+            {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                "response_format": {"type": response_format},
+                "temperature": temperature,
+                "top_p": top_p,
+                "max_completion_tokens": max_completion_tokens,
+                "presence_penalty": presence_penalty,
+                "frequency_penalty": frequency_penalty,
+            }
+            for prompt in prompt_list
+        ]
+
+        client = get_openai_client(openai_api_key)
+        try:
+            state, results = run_batch_job(client, "/v1/chat/completions", bodies, max_wait_seconds)
+        except Exception as e:
+            error_msg = f"Error during batch job: {str(e)}"
+            logger.error(error_msg)
+            record_error("openai_batch_job")
+            return (error_msg, None)
+
+        if results is None:
+            logger.info(f"OpenAI batch {state['batch_id']} is {state['status']}")
+            return (json.dumps([]), json.dumps(state))
+
+        responses = []
+        for result in results:
+            if result["error"] is not None:
+                responses.append({"response": None, "error": result["error"]})
+            else:
+                message = result["body"]["choices"][0]["message"]
+                content = message.get("content")
+                if content is None:
+                    # Tool calls and refusals come back without text content
+                    refusal = message.get("refusal")
+                    responses.append({"response": None, "error": f"Refused: {refusal}" if refusal else None})
+                else:
+                    responses.append({"response": content.strip(), "error": None})
+        return (json.dumps(responses), json.dumps(state))
@@ -1,12 +1,13 @@
 import os
-from openai import OpenAI
+from ..common.metrics import log_sampled, record_error, record_usage, timed
+from ..common.scheduler import get_scheduler
+from ..common.openai_client import account_id, get_openai_client
+from ..common.chat_cache import OpenAIChatCaching
+from ..common.response_cache import get_response_cache
+from ..common.tokens import OVERFLOW_STRATEGIES, ContextWindowExceeded, budget_chat_request
 import json
 import logging
-import dotenv
 
-dotenv.load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 OPENAI_MODELS = [
@@ -21,7 +22,7 @@ OPENAI_MODELS = [
     "o1-preview",
 ]
 
-class OpenAIAPIWithAPIKey:
+class OpenAIAPIWithAPIKey(OpenAIChatCaching):
 
     @classmethod
     def INPUT_TYPES(s):
@@ -37,49 +38,79 @@ class OpenAIAPIWithAPIKey:
                 "presence_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
                 "frequency_penalty": ("FLOAT", {"default": 0.0, "min": -2.0, "max": 2.0, "step": 0.01}),
                 "openai_api_key": ("STRING", {"multiline": False}),
+            },
+            "optional": {
+                "use_cache": ("BOOLEAN", {"default": False}),
+                "overflow_strategy": (OVERFLOW_STRATEGIES, ),
+                "auto_max_tokens": ("BOOLEAN", {"default": False}),
             }
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("response",)
+    RETURN_TYPES = ("STRING", "INT", "INT")
+    RETURN_NAMES = ("response", "input_tokens", "max_completion_tokens")
     FUNCTION = "api_call"
     CATEGORY = "llm"
 
-    def api_call(self, model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, openai_api_key):
+    @timed("openai_with_api_key")
+    def api_call(self, model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, openai_api_key, use_cache=False, overflow_strategy="truncate", auto_max_tokens=False):
         if prompt == "" or prompt == "exit" or prompt is None:
-            return (None, )
+            return (None, 0, 0)
         
         if not openai_api_key:
             logger.info("OpenAI API key not set")
-            return "OpenAI API key not set"
+            return ("OpenAI API key not set", 0, 0)
         
-        client = OpenAI(
-            api_key=openai_api_key,
-        )
+        try:
+            budget = budget_chat_request(model, system_prompt, prompt, max_completion_tokens, overflow_strategy, auto_max_tokens)
+        except ContextWindowExceeded as e:
+            logger.error(str(e))
+            return (str(e), 0, 0)
+
+        input_tokens = budget["input_tokens"]
+        completion_tokens = budget["max_completion_tokens"]
+
+        client = get_openai_client(openai_api_key, max_retries=0)
+
+        cache = get_response_cache() if use_cache else None
+        cache_key = None
+        if cache is not None:
+            cache_key = self._cache_key(model, system_prompt, prompt, response_format, temperature, top_p, max_completion_tokens, presence_penalty, frequency_penalty, overflow_strategy, auto_max_tokens, account_id(client))
+            cached_response = cache.get(cache_key)
+            if cached_response is not None:
+                logger.info("Returning cached OpenAI response")
+                return (cached_response, input_tokens, completion_tokens)
         
         try:
-            response = client.chat.completions.create(
+            response = get_scheduler().call(
+                lambda: client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=[
+                      {"role": "system", "content": system_prompt},
+                      {"role": "user", "content": budget["prompt"]}
+                    ],
+                    response_format={
+                      "type": response_format
+                    },
+                    temperature=temperature,
+                    top_p=top_p,
+                    max_completion_tokens=completion_tokens,
+                    presence_penalty=presence_penalty,
+                    frequency_penalty=frequency_penalty,
+                ),
+                api_key=openai_api_key,
                 model=model,
-                messages=[
-                  {"role": "system", "content": system_prompt},
-                  {"role": "user", "content": prompt}
-                ],
-                response_format={
-                  "type": response_format
-                },
-                temperature=temperature,
-                top_p=top_p,
-                max_completion_tokens=max_completion_tokens,
-                presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty,
+                estimated_tokens=input_tokens + completion_tokens,
             )
             
-            logger.info(response)           
+            record_usage("openai_with_api_key", response.usage)
+            log_sampled(logger, "OpenAI response: %s", response)
             full_response = response.choices[0].message.content.strip()
                 
-            logger.info(full_response)
-            return (full_response, )
+            if cache_key is not None:
+                cache.put(cache_key, full_response)
+            return (full_response, input_tokens, completion_tokens)
         except Exception as e:
             error_msg = f"Error during API call: {str(e)}"
             logger.error(error_msg)
-            return (error_msg, )
\ No newline at end of file
+            record_error("openai_with_api_key")
+            return (error_msg, input_tokens, completion_tokens)
\ No newline at end of file
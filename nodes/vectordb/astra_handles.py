@@ -0,0 +1,169 @@
+"""
+Process-wide cache of Astra DB handles.
+
+Building a `DataAPIClient`, resolving the database and opening a
+collection on every execution costs several objects and a fresh HTTP
+connection pool (each astrapy Collection owns its own httpx client), so a
+small search spends most of its time on setup. Handles are cached here by
+(token, endpoint, keyspace, collection) and reused; one that has been idle
+for `FLOWSCALE_ASTRA_HEALTH_CHECK_SECONDS` is checked with a cheap request
+before reuse, and one idle for `FLOWSCALE_ASTRA_IDLE_SECONDS` is dropped.
+Callers invalidate a handle when a request through it fails.
+
+Dropped handles are never closed explicitly: another thread may still be
+reading through the same collection (a failed ingest invalidating it must
+not break a concurrent search), so its connection pool is released by
+garbage collection once the last user lets go of it.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ASTRA_IDLE_SECONDS = float(os.environ.get("FLOWSCALE_ASTRA_IDLE_SECONDS", "900"))
+ASTRA_HEALTH_CHECK_SECONDS = float(os.environ.get("FLOWSCALE_ASTRA_HEALTH_CHECK_SECONDS", "120"))
+ASTRA_MAX_HANDLES = int(os.environ.get("FLOWSCALE_ASTRA_MAX_HANDLES", "32"))
+
+
+class HandleCache:
+    """
+    Thread-safe LRU of handles built by `factory()` on first use, with
+    idle eviction and a health check before reusing a handle that has sat
+    unused for `health_check_seconds`. Evicted and invalidated handles are
+    only forgotten, never closed, since callers may still be using them.
+    """
+
+    def __init__(self, max_size: int = ASTRA_MAX_HANDLES, idle_seconds: float = ASTRA_IDLE_SECONDS,
+                 health_check_seconds: float = ASTRA_HEALTH_CHECK_SECONDS):
+        self.max_size = max(1, max_size)
+        self.idle_seconds = idle_seconds
+        self.health_check_seconds = health_check_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory, health_check=None):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle_locked(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            handle, last_used = entry
+            if health_check is None or now - last_used < self.health_check_seconds:
+                self._touch(key, handle, now)
+                return handle
+            try:
+                health_check(handle)
+                self._touch(key, handle, now)
+                return handle
+            except Exception as e:
+                logger.info(f"Discarding unhealthy cached handle: {e}")
+                self.invalidate(key)
+
+        handle = factory()
+        with self._lock:
+            self._entries[key] = (handle, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return handle
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _touch(self, key, handle, now):
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (handle, now)
+
+    def _evict_idle_locked(self, now):
+        for key in [key for key, (_, last_used) in self._entries.items() if now - last_used > self.idle_seconds]:
+            del self._entries[key]
+
+
+_collections = HandleCache()
+_vector_stores = HandleCache()
+
+
+def resolve_astra_credentials(token: str, endpoint: str):
+    """
+    Falls back to ASTRA_DB_APPLICATION_TOKEN / ASTRA_DB_API_ENDPOINT for
+    blank inputs. Raises ValueError if either is still missing.
+    """
+    final_token = (token or "").strip() or os.environ.get("ASTRA_DB_APPLICATION_TOKEN")
+    final_endpoint = (endpoint or "").strip() or os.environ.get("ASTRA_DB_API_ENDPOINT")
+    if not final_token or not final_endpoint:
+        raise ValueError("Missing Astra DB token or endpoint.")
+    return final_token, final_endpoint
+
+
+def collection_scope(backend: str, endpoint: str, collection_name: str) -> str:
+    """
+    Identifies a collection across backends and endpoints, for the local
+    indexes and caches kept alongside it.
+    """
+    endpoint = "" if backend == "local" else (endpoint or "").strip() or os.environ.get("ASTRA_DB_API_ENDPOINT", "")
+    return f"{backend}\x00{endpoint}\x00{collection_name}"
+
+
+def _collection_key(token, endpoint, collection_name, keyspace):
+    return (token, endpoint, keyspace or None, collection_name)
+
+
+def get_astra_collection(token: str, endpoint: str, collection_name: str, keyspace: str = None):
+    """
+    Returns a cached astrapy Collection for the given credentials.
+    """
+    token, endpoint = resolve_astra_credentials(token, endpoint)
+
+    def factory():
+        from astrapy import DataAPIClient
+
+        database = DataAPIClient(token=token).get_database_by_api_endpoint(endpoint, keyspace=keyspace or None)
+        return database.get_collection(collection_name)
+
+    return _collections.get(
+        _collection_key(token, endpoint, collection_name, keyspace),
+        factory,
+        health_check=lambda collection: collection.options(timeout_ms=5000),
+    )
+
+
+def invalidate_astra_collection(token: str, endpoint: str, collection_name: str, keyspace: str = None):
+    try:
+        token, endpoint = resolve_astra_credentials(token, endpoint)
+    except ValueError:
+        return
+    _collections.invalidate(_collection_key(token, endpoint, collection_name, keyspace))
+
+
+def get_cached_vector_store(key, factory):
+    """
+    Returns a cached vector store (e.g. a LangChain AstraDBVectorStore),
+    building it with `factory()` the first time `key` is seen. Construction
+    can check or create the collection, so it should happen once.
+    """
+    return _vector_stores.get(key, factory)
+
+
+def invalidate_vector_store(key):
+    _vector_stores.invalidate(key)
+
+
+def clear_astra_handles():
+    """
+    Forgets every cached handle.
+    """
+    _collections.clear()
+    _vector_stores.clear()
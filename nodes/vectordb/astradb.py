@@ -1,10 +1,28 @@
 import os
 import json
-import requests
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain.docstore.document import Document
-from langchain_astradb import AstraDBVectorStore
-from astrapy.admin import parse_api_endpoint
+import time
+import uuid
+import logging
+
+from ..common.embedder import embed_texts
+from ..common.embeddings import EMBEDDING_TYPE, coerce_embedding
+from ..common.inputs import parse_prompt_list, parse_record_list
+from ..common.metrics import record_bytes, record_error, timed
+from ..common.pipeline import run_pipeline
+from .astra_handles import get_astra_collection, get_cached_vector_store, invalidate_astra_collection, invalidate_vector_store
+from .local_store import BACKENDS, get_local_collection
+
+logger = logging.getLogger(__name__)
+
+# ada-002 stays the default so existing collections keep one vector space
+EMBEDDING_MODELS = [
+    "text-embedding-ada-002",
+    "text-embedding-3-small",
+    "text-embedding-3-large",
+]
+
+# At most this many failed ids are listed in the status message; all are logged
+FAILED_IDS_REPORTED = 100
 
 class AstraDBStoreEmbeddingsNode:
     """
@@ -15,6 +33,14 @@ class AstraDBStoreEmbeddingsNode:
     2) Uses an OpenAI Embedding model to generate embeddings.
     3) Stores the embeddings in a specified Astra DB collection.
     4) Returns a status string for success or failure.
+
+    With `bulk_input`, `text_data` holds many documents (JSON Lines or a
+    JSON array, see `parse_record_list`) that are embedded in batches and
+    written with concurrent unordered inserts.
+
+    A precomputed `embedding` (e.g. from OpenAIEmbedding) skips the OpenAI
+    call: one row stores text_data whole, several rows store one document
+    per text (a JSON array or one per line), or per record in bulk mode.
     """
 
     @classmethod
@@ -31,6 +57,13 @@ class AstraDBStoreEmbeddingsNode:
                 "keyspace": ("STRING", {}),          # Optional Astra DB keyspace (namespace)
                 "metadata_json": ("STRING", {"multiline": True}),  # Additional metadata in JSON format
                 "silent_errors": ("BOOLEAN",),       # Toggle silent/fail-hard mode
+                "backend": (BACKENDS, ),             # "local" stores in the in-process vector store
+                "embedding_model": (EMBEDDING_MODELS, ),
+                "bulk_input": ("BOOLEAN", {"default": False}),  # text_data is JSONL / a JSON array of records
+                "embed_batch_size": ("INT", {"default": 256, "min": 1, "max": 2048}),
+                "insert_batch_size": ("INT", {"default": 50, "min": 1, "max": 100}),
+                "insert_concurrency": ("INT", {"default": 4, "min": 1, "max": 32}),
+                "embedding": (EMBEDDING_TYPE, ),    # Precomputed vectors, one row per document
             }
         }
 
@@ -38,6 +71,7 @@ class AstraDBStoreEmbeddingsNode:
     FUNCTION = "store_embeddings"
     CATEGORY = "VectorDB"
 
+    @timed("astradb_store_embeddings")
     def store_embeddings(
         self,
         text_data,
@@ -47,10 +81,18 @@ class AstraDBStoreEmbeddingsNode:
         openai_api_key=None,
         keyspace=None,
         metadata_json="{}",
-        silent_errors=True
+        silent_errors=True,
+        backend="astradb",
+        embedding_model="text-embedding-ada-002",
+        bulk_input=False,
+        embed_batch_size=256,
+        insert_batch_size=50,
+        insert_concurrency=4,
+        embedding=None,
     ):
         """
         Generates embeddings for the provided text, then stores them in Astra DB.
+        `metadata_json` is merged under each bulk record's own metadata.
         """
         # 1. Validate text content
         if not text_data.strip():
@@ -61,7 +103,7 @@ class AstraDBStoreEmbeddingsNode:
         # 2. Set OpenAI API key if provided
         if openai_api_key and openai_api_key.strip():
             os.environ["OPENAI_API_KEY"] = openai_api_key.strip()
-        elif os.getenv("OPENAI_API_KEY") is None:
+        elif os.getenv("OPENAI_API_KEY") is None and embedding is None:
             if silent_errors:
                 return ("OpenAI API key not set, and silent_errors=True. Skipping embedding...",)
             raise ValueError("OpenAI API key is not set. Provide one or set OPENAI_API_KEY in env.")
@@ -69,35 +111,213 @@ class AstraDBStoreEmbeddingsNode:
         # 3. Prepare metadata
         try:
             doc_metadata = json.loads(metadata_json) if metadata_json.strip() else {}
+            if not isinstance(doc_metadata, dict):
+                raise ValueError(f"expected a JSON object, got {type(doc_metadata).__name__}")
         except Exception as e:
             if silent_errors:
                 return (f"Invalid metadata JSON. Error: {e}",)
             raise ValueError(f"Failed to parse metadata JSON: {e}")
 
+        if bulk_input or embedding is not None:
+            try:
+                matrix = coerce_embedding(embedding) if embedding is not None else None
+                if bulk_input:
+                    records = parse_record_list(text_data)
+                elif len(matrix) == 1:
+                    records = [(text_data, {}, None)]
+                else:
+                    records = [(text, {}, None) for text in parse_prompt_list(text_data)]
+                if matrix is not None and len(matrix) != len(records):
+                    raise ValueError(f"{len(matrix)} embeddings for {len(records)} documents")
+            except ValueError as e:
+                if silent_errors:
+                    return (f"Invalid bulk input: {e}",)
+                raise
+            return self._store_bulk(
+                records, astra_token, astra_api_endpoint, collection_name, keyspace, doc_metadata,
+                embedding_model, embed_batch_size, insert_batch_size, insert_concurrency, silent_errors, backend,
+                matrix,
+            )
+
+        if backend == "local":
+            return self._store_local(text_data, collection_name, doc_metadata, silent_errors, embedding_model)
+
+        # LangChain and astrapy are slow to import, so only load them once
+        # the node actually runs against Astra DB
+        from langchain.docstore.document import Document
+
         document = Document(page_content=text_data, metadata=doc_metadata)
 
-        # 4. Generate embeddings using OpenAI
+        # 4./5. Reuse the AstraDBVectorStore (and its OpenAI embeddings) for
+        # these settings; building one can check or create the collection.
+        store_key = (astra_token, astra_api_endpoint, keyspace or None, collection_name, os.environ["OPENAI_API_KEY"], embedding_model)
+
+        def build_vector_store():
+            from langchain_community.embeddings import OpenAIEmbeddings
+            from langchain_astradb import AstraDBVectorStore
+            from astrapy.admin import parse_api_endpoint
+
+            try:
+                embeddings = OpenAIEmbeddings(model=embedding_model)
+            except Exception as e:
+                raise ValueError(f"Failed to initialize OpenAI embeddings: {e}")
+
+            try:
+                parsed_endpoint = parse_api_endpoint(astra_api_endpoint)
+                return AstraDBVectorStore(
+                    collection_name=collection_name,
+                    token=astra_token,
+                    api_endpoint=astra_api_endpoint,
+                    namespace=keyspace,
+                    environment=parsed_endpoint.environment if parsed_endpoint else None,
+                    embedding=embeddings,
+                )
+            except Exception as e:
+                raise ValueError(f"Failed to initialize AstraDBVectorStore: {e}")
+
+        try:
+            vector_store = get_cached_vector_store(store_key, build_vector_store)
+        except ValueError as e:
+            if silent_errors:
+                record_error("astradb_store_embeddings")
+                return (str(e),)
+            raise
+
+        # 6. Add document to the vector store
+        try:
+            inserted_ids = vector_store.add_documents([document])
+        except Exception as e:
+            invalidate_vector_store(store_key)
+            if silent_errors:
+                record_error("astradb_store_embeddings")
+                return (f"Failed to store document: {e}",)
+            raise ValueError(f"Failed to store document: {e}")
+
+        return (f"Stored document {inserted_ids[0]} in collection {collection_name}.",)
+
+    def _store_local(self, text_data, collection_name, doc_metadata, silent_errors, embedding_model="text-embedding-ada-002"):
+        """
+        Stores the document in the local vector store, in the same
+        content / metadata / $vector shape AstraDBVectorStore writes.
+        """
         try:
-            embedding_model = OpenAIEmbeddings(model="text-embedding-ada-002")
+            embedding = embed_texts(os.environ["OPENAI_API_KEY"], embedding_model, [text_data], node="astradb_store_embeddings")[0]
+            collection = get_local_collection(collection_name)
+            result = collection.insert_many([{"content": text_data, "metadata": doc_metadata, "$vector": embedding.tolist()}])
         except Exception as e:
             if silent_errors:
-                return (f"Failed to initialize OpenAI embeddings: {e}",)
-            raise ValueError(f"Failed to initialize OpenAI embeddings: {e}")
+                record_error("astradb_store_embeddings")
+                return (f"Failed to store document locally: {e}",)
+            raise
+        return (f"Stored document {result.inserted_ids[0]} in local collection {collection_name}.",)
+
+    def _store_bulk(
+        self,
+        records,
+        astra_token,
+        astra_api_endpoint,
+        collection_name,
+        keyspace,
+        base_metadata,
+        embedding_model,
+        embed_batch_size,
+        insert_batch_size,
+        insert_concurrency,
+        silent_errors,
+        backend,
+        matrix=None,
+    ):
+        """
+        Stores every (text, metadata, _id) record, run as a two-stage pipeline:
+        each group of `embed_batch_size` records is embedded while the
+        previous group is inserted with unordered `insert_many` calls of
+        `insert_batch_size` documents, `insert_concurrency` at a time.
+        Documents are written in the content / metadata / $vector shape
+        AstraDBVectorStore uses, so the collection must already exist.
+        A group whose embedding or insert fails is recorded and the load
+        carries on; the status lists the ids that were not stored. With a
+        precomputed `matrix`, row i is used for record i instead of OpenAI.
+        """
+        if not records:
+            if silent_errors:
+                return ("No text provided.",)
+            raise ValueError("No records provided for embeddings.")
 
-        # 5. Initialize AstraDBVectorStore
         try:
-            parsed_endpoint = parse_api_endpoint(astra_api_endpoint)
-            vector_store = AstraDBVectorStore(
-                collection_name=collection_name,
-                token=astra_token,
-                api_endpoint=astra_api_endpoint,
-                namespace=keyspace,
-                environment=parsed_endpoint.environment if parsed_endpoint else None,
-                embedding=embedding_model,
-            )
+            if backend == "local":
+                collection = get_local_collection(collection_name)
+            else:
+                collection = get_astra_collection(astra_token, astra_api_endpoint, collection_name, keyspace)
         except Exception as e:
             if silent_errors:
-                return (f"Failed to initialize AstraDBVectorStore: {e}",)
-            raise ValueError(f"Failed to initialize AstraDBVectorStore: {e}")
+                return (f"Failed to open collection {collection_name}: {e}",)
+            raise
+
+        api_key = os.environ.get("OPENAI_API_KEY")
+        # Records without an _id get a random one up front, so failures can be reported by id
+        documents = [
+            {"_id": doc_id or uuid.uuid4().hex, "content": text, "metadata": {**base_metadata, **metadata}}
+            for text, metadata, doc_id in records
+        ]
+        groups = ((start, documents[start:start + embed_batch_size]) for start in range(0, len(documents), embed_batch_size))
+
+        def embed_stage(batch):
+            start, group = batch
+            if matrix is not None:
+                return group, matrix[start:start + len(group)]
+            try:
+                embeddings = embed_texts(api_key, embedding_model, [document["content"] for document in group], node="astradb_store_embeddings")
+            except Exception:
+                logger.exception("Failed to embed %d documents.", len(group))
+                record_error("astradb_store_embeddings")
+                return group, None
+            return group, embeddings
+
+        def insert_stage(batch):
+            group, embeddings = batch
+            if embeddings is None:
+                return 0, [document["_id"] for document in group]
+            for document, embedding in zip(group, embeddings):
+                document["$vector"] = embedding.tolist()
+            try:
+                inserted_ids = collection.insert_many(
+                    group,
+                    ordered=False,
+                    chunk_size=insert_batch_size,
+                    concurrency=insert_concurrency,
+                ).inserted_ids
+            except Exception as e:
+                logger.exception("Failed to insert documents.")
+                record_error("astradb_store_embeddings")
+                inserted_ids = getattr(e, "inserted_ids", None) or []
+            finally:
+                # Only keep vectors for the groups in flight
+                for document in group:
+                    document.pop("$vector", None)
+            record_bytes("astradb_store_embeddings", sum(len(document["content"]) for document in group), "out")
+            inserted = set(inserted_ids)
+            return len(inserted), [document["_id"] for document in group if document["_id"] not in inserted]
+
+        started = time.perf_counter()
+        batch_results = run_pipeline(groups, [embed_stage, insert_stage])
+        elapsed = time.perf_counter() - started
+
+        stored_count = sum(stored for stored, _ in batch_results)
+        failed_ids = [doc_id for _, failed in batch_results for doc_id in failed]
+        rate = stored_count / elapsed if elapsed > 0 else 0.0
+        status = (
+            f"Stored {stored_count} of {len(documents)} documents in collection {collection_name} "
+            f"in {elapsed:.2f}s ({rate:.1f} docs/s)."
+        )
+        if not failed_ids:
+            return (status,)
 
-        # 6. Add document t
+        if backend != "local":
+            invalidate_astra_collection(astra_token, astra_api_endpoint, collection_name, keyspace)
+        logger.warning("Failed to store %d documents: %s", len(failed_ids), failed_ids)
+        listed = json.dumps(failed_ids[:FAILED_IDS_REPORTED])
+        if len(failed_ids) > FAILED_IDS_REPORTED:
+            listed += f" and {len(failed_ids) - FAILED_IDS_REPORTED} more"
+        if not silent_errors:
+            raise ValueError(f"{status} Failed ids: {listed}")
+        return (f"{status} Failed ids: {listed}",)
@@ -1,18 +1,54 @@
 import os
 import json
+import time
+import hashlib
 import logging
 from datetime import datetime
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 
-import dotenv
-import requests
-from openai import OpenAI
-from astrapy import DataAPIClient
 
-dotenv.load_dotenv()
-logging.basicConfig(level=logging.INFO)
+from ..common.chunking import iter_chunks
+from ..common.embedder import embed_texts
+from ..common.embedding_cache import normalize_text
+from ..common.embeddings import EMBEDDING_TYPE, coerce_embedding
+from ..common.inputs import parse_prompt_list
+from ..common.metrics import record_bytes, record_error, timed
+from ..common.pipeline import run_pipeline
+from .astra_handles import collection_scope, get_astra_collection, invalidate_astra_collection
+from .lexical_index import get_lexical_index
+from .local_store import BACKENDS, get_local_collection
+from .memory_cache import get_memory_cache, make_message
+
 logger = logging.getLogger(__name__)
 
+# The Data API accepts at most 100 values in an $in filter
+EXISTENCE_CHECK_BATCH = 100
+
+
+def document_id(conversation_id: str, content: str) -> str:
+    """
+    Deterministic `_id` for a chunk, so re-ingesting the same text in the
+    same conversation maps to the same documents.
+    """
+    payload = f"{conversation_id}\x00{normalize_text(content)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _duplicates_only(error) -> bool:
+    """
+    True if an insert_many error only reports documents that already exist
+    (inserted concurrently by another run), which is fine for idempotent ids.
+    """
+    exceptions = getattr(error, "exceptions", None)
+    if not exceptions:
+        return False
+    for exception in exceptions:
+        descriptors = getattr(exception, "error_descriptors", None)
+        if not descriptors or any(descriptor.error_code != "DOCUMENT_ALREADY_EXISTS" for descriptor in descriptors):
+            return False
+    return True
+
+
 class AstraOpenAIIngestNode:
     """
     This node ingests (stores) text items into an Astra DB collection
@@ -27,6 +63,14 @@ class AstraOpenAIIngestNode:
         - item_text: The content you want to store
         - openai_api_key: Optionally provided by the user (though the code also loads from ENV)
         - astradb_token, astradb_endpoint, collection_name: For connecting to your Astra DB
+        - chunk_size, chunk_overlap: Target tokens per chunk, and tokens repeated between neighbouring chunks.
+          chunk_size used to be in characters (default 1000); a saved workflow still holding 1000 now asks
+          for 1000-token chunks, about four times larger, so re-check it
+        - embed_batch_size: Chunks embedded (and then inserted) per pipeline batch
+        - insert_batch_size, insert_concurrency: Documents per insert request, and parallel requests
+        - backend: "astradb", or "local" for the in-process store (token and endpoint are then ignored)
+        - embeddings: Precomputed EMBEDDING rows (e.g. from OpenAIEmbedding); item_text is then stored as is,
+          one document per row, instead of being chunked and embedded
         """
         return {
             "required": {
@@ -34,8 +78,17 @@ class AstraOpenAIIngestNode:
                 "astradb_token": ("STRING", {"multiline": False, "default": ""}),
                 "astradb_endpoint": ("STRING", {"multiline": False, "default": ""}),
                 "collection_name": ("STRING", {"multiline": False, "default": ""}),
-                "chunk_size": ("INT", {"default": 1000}),
+                "chunk_size": ("INT", {"default": 512, "min": 16, "max": 8191,
+                                       "tooltip": "Tokens per chunk. Previously characters (default 1000)."}),
                 "conversation_id": ("STRING", {"multiline": False, "default": ""}),
+            },
+            "optional": {
+                "chunk_overlap": ("INT", {"default": 64, "min": 0, "max": 4096}),
+                "embed_batch_size": ("INT", {"default": 256, "min": 1, "max": 2048}),
+                "insert_batch_size": ("INT", {"default": 50, "min": 1, "max": 100}),
+                "insert_concurrency": ("INT", {"default": 4, "min": 1, "max": 32}),
+                "backend": (BACKENDS, ),
+                "embeddings": (EMBEDDING_TYPE, ),
             }
         }
 
@@ -43,6 +96,7 @@ class AstraOpenAIIngestNode:
     FUNCTION = "ingest_to_astra"
     CATEGORY = "Astra / Ingest"
 
+    @timed("astradb_ingest")
     def ingest_to_astra(
         self,
         item_text: str,
@@ -50,106 +104,238 @@ class AstraOpenAIIngestNode:
         astradb_endpoint: str,
         collection_name: str,
         chunk_size: int,
-        conversation_id: str
+        conversation_id: str,
+        chunk_overlap: int = 64,
+        embed_batch_size: int = 256,
+        insert_batch_size: int = 50,
+        insert_concurrency: int = 4,
+        backend: str = "astradb",
+        embeddings=None,
     ) -> Tuple[str]:
         """
-        Main function for ingestion:
-          1) Generate embedding for item_text using OpenAI.
-          2) Store the text & embedding in Astra DB as a new document.
+        Main function for ingestion, run as a pipeline with bounded queues
+        between the stages:
+          1) Split item_text into token-budgeted chunks, grouped into batches.
+          2) Derive each chunk's `_id` from (conversation_id, content) and
+             drop the chunks whose documents already exist.
+          3) Generate embeddings for the new chunks using OpenAI.
+          4) Insert them into Astra DB, add the chunks to the local BM25
+             index used by hybrid search, and to any cached memory window
+             of the conversation.
+        The stages overlap across batches, and at most a few batches are
+        held in memory at once. Re-running on unchanged text embeds and
+        writes nothing.
+        With precomputed `embeddings`, step 1 takes item_text whole (one
+        row) or as a JSON array / one text per line (one row per text),
+        and step 3 uses the given rows instead of calling OpenAI.
         Returns a status message.
-        """        
-        chunks = self._chunk_text(item_text, chunk_size=chunk_size)
-        
-        if not chunks:
-            return ("No text to ingest!",)
+        """
+        precomputed = None
+        if embeddings is not None:
+            try:
+                precomputed = self._precomputed_rows(item_text, embeddings)
+            except ValueError as e:
+                return (f"Error storing document: {e}",)
+
+        final_api_key = os.environ.get("OPENAI_API_KEY")
+
+        if not final_api_key and precomputed is None:
+            logger.error("OpenAI API key not set in node input or environment.")
+            return ("Failed to generate embedding: OpenAI API key not set",)
+
+        try:
+            collection = self._get_collection(astradb_token, astradb_endpoint, collection_name, backend)
+        except Exception as e:
+            logger.exception("Error while connecting to Astra DB.")
+            record_error("astradb_ingest")
+            return (f"Error storing document: {e}",)
 
-        embeddings = self._generate_openai_embedding(chunks)
-        if isinstance(embeddings, str):
-            return (f"Failed to generate embedding: {embeddings}",)
-        
+        embedding_model = "text-embedding-3-small"
+
+        lexical_index = get_lexical_index(backend, astradb_endpoint, collection_name)
+        memory_cache = get_memory_cache()
+        scope = collection_scope(backend, astradb_endpoint, collection_name)
+
+        def filter_stage(chunks):
+            ids = [document_id(conversation_id, chunk) for chunk in chunks]
+            existing = self._existing_ids(collection, ids)
+            return ids, chunks, [doc_id not in existing for doc_id in ids]
+
+        def embed_stage(batch):
+            ids, chunks, is_new = batch
+            new_chunks = [chunk for chunk, new in zip(chunks, is_new) if new]
+            if precomputed is not None:
+                vectors = [precomputed[chunk] for chunk in new_chunks]
+            else:
+                vectors = self._generate_openai_embedding(new_chunks, final_api_key, embedding_model) if new_chunks else []
+            return ids, chunks, is_new, vectors
+
+        def insert_stage(batch):
+            ids, chunks, is_new, embeddings = batch
+            new_ids = [doc_id for doc_id, new in zip(ids, is_new) if new]
+            new_chunks = [chunk for chunk, new in zip(chunks, is_new) if new]
+            timestamp = datetime.now().isoformat()
+            inserted = 0
+            if new_chunks:
+                inserted = self._insert_documents(collection, new_ids, new_chunks, embeddings, conversation_id, insert_batch_size, insert_concurrency, timestamp)
+                # Keep cached chat-memory windows current; later chunks first
+                memory_cache.prepend(scope, conversation_id, [make_message(chunk, timestamp) for chunk in reversed(new_chunks)])
+            # Unchanged chunks are indexed too, so documents stored before
+            # the lexical index existed are picked up on re-ingest
+            self._index_chunks(lexical_index, ids, chunks, conversation_id, timestamp)
+            return inserted, len(chunks) - len(new_chunks)
+
+        started = time.perf_counter()
         try:
-            inserted_count = self._store_in_astra_db(
-                astradb_token,
-                astradb_endpoint,
-                collection_name,
-                chunks,
-                embeddings,
-                conversation_id
+            if precomputed is not None:
+                batches = self._batches(iter(precomputed), embed_batch_size)
+            else:
+                batches = self._iter_chunk_batches(item_text, chunk_size, chunk_overlap, embed_batch_size, embedding_model)
+            batch_counts = run_pipeline(
+                batches,
+                [filter_stage, embed_stage, insert_stage],
             )
         except Exception as e:
-            logger.exception("Error while storing document in Astra DB.")
+            logger.exception("Error while ingesting document into Astra DB.")
+            record_error("astradb_ingest")
+            # Part of the text may have been written; refetch memory next time
+            memory_cache.invalidate(scope, conversation_id)
+            if backend != "local":
+                invalidate_astra_collection(astradb_token, astradb_endpoint, collection_name)
             return (f"Error storing document: {e}",)
 
-        return (f"Successfully inserted {inserted_count} documents.",)
+        if not batch_counts:
+            return ("No text to ingest!",)
+        inserted_count = sum(inserted for inserted, _ in batch_counts)
+        skipped_count = sum(skipped for _, skipped in batch_counts)
+
+        elapsed = time.perf_counter() - started
+        rate = inserted_count / elapsed if elapsed > 0 else 0.0
+        return (f"Successfully inserted {inserted_count} documents ({skipped_count} unchanged skipped) in {elapsed:.2f}s ({rate:.1f} docs/s).",)
 
-    def _chunk_text(self, text: str, chunk_size: int = 1000) -> List[str]:
+    def _chunk_text(self, text: str, chunk_size: int = 512, chunk_overlap: int = 64, embedding_model: str = "text-embedding-3-small") -> Iterator[str]:
         """
-        Splits `text` into a list of substrings, each with a maximum length
-        of `chunk_size` characters.
+        Lazily splits `text` on paragraph, sentence and word boundaries
+        into chunks of about `chunk_size` tokens, with `chunk_overlap`
+        tokens shared between neighbouring chunks.
         """
-        text = text.strip()
-        return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+        return iter_chunks(text, chunk_size, chunk_overlap, embedding_model)
 
-    def _generate_openai_embedding(self, chunks: List[str], embedding_model: str = "text-embedding-3-small"):
+    def _iter_chunk_batches(self, text: str, chunk_size: int, chunk_overlap: int, batch_size: int, embedding_model: str) -> Iterator[List[str]]:
+        return self._batches(self._chunk_text(text, chunk_size, chunk_overlap, embedding_model), batch_size)
+
+    def _batches(self, chunks: Iterator[str], batch_size: int) -> Iterator[List[str]]:
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _precomputed_rows(self, item_text: str, embeddings) -> dict:
         """
-        Calls OpenAI to generate an embedding vector from the provided text. 
-        Reads the API key from environment variables if no user input is given.
+        Pairs precomputed embedding rows with their texts: one row stores
+        item_text whole, several rows split it like OpenAIEmbedding's
+        `batch_input`. Returns {text: row} in input order; a repeated text
+        is stored once.
         """
-        # If no openai_api_key is provided via the node input, fallback to .env
-        final_api_key = os.environ.get("OPENAI_API_KEY")
+        matrix = coerce_embedding(embeddings)
+        texts = [item_text] if len(matrix) == 1 else parse_prompt_list(item_text)
+        if len(texts) != len(matrix):
+            raise ValueError(f"{len(matrix)} embeddings for {len(texts)} texts")
+        rows = {}
+        for text, row in zip(texts, matrix):
+            if text.strip():
+                rows.setdefault(text, row)
+        return rows
 
-        if not final_api_key:
-            logger.error("OpenAI API key not set in node input or environment.")
-            return "OpenAI API key not set"
-
-        client = OpenAI(api_key=final_api_key)
-        try:
-            embedding_obj = client.embeddings.create(input=chunks, model=embedding_model)
-            return [item.embedding for item in embedding_obj.data]
-        except Exception as e:
-            logger.exception("Error generating embedding from OpenAI.")
-            return f"Error generating embedding: {e}"
+    def _generate_openai_embedding(self, chunks: List[str], api_key: str, embedding_model: str = "text-embedding-3-small"):
+        """
+        Calls OpenAI (through the shared embedding cache and batcher) to
+        generate one embedding vector per chunk. Raises on API errors.
+        """
+        return embed_texts(api_key, embedding_model, chunks, node="astradb_ingest")
 
-    def _store_in_astra_db(
-        self,
-        astradb_token: str,
-        astradb_endpoint: str,
-        collection_name: str,
-        chunks: List[str],
-        embeddings: List[List[float]],
-        conversation_id: str
-    ):
+    def _get_collection(self, astradb_token: str, astradb_endpoint: str, collection_name: str, backend: str = "astradb"):
         """
-        Uses astrapy’s DataAPIClient to connect to Astra DB and insert a new document
-        containing the user text and its associated embedding vector.
+        Uses astrapy’s DataAPIClient to connect to the Astra DB collection,
+        or opens the local collection of the same name.
         """
-        final_astra_token = astradb_token.strip() or os.environ.get("ASTRA_DB_APPLICATION_TOKEN")
-        final_astra_endpoint = astradb_endpoint.strip() or os.environ.get("ASTRA_DB_API_ENDPOINT")
+        if backend == "local":
+            return get_local_collection(collection_name)
 
-        if not final_astra_token or not final_astra_endpoint:
-            raise ValueError("Missing Astra DB token or endpoint.")
+        # Reuse the cached client and connection pool for these credentials
+        return get_astra_collection(astradb_token, astradb_endpoint, collection_name)
 
-        # Initialize the Astra DB client
-        client = DataAPIClient(token=final_astra_token)
-        db = client.get_database_by_api_endpoint(final_astra_endpoint)
+    def _existing_ids(self, collection, ids: List[str]) -> set:
+        """
+        Returns the subset of `ids` already stored, checked in bulk with
+        `$in` filters of up to EXISTENCE_CHECK_BATCH ids.
+        """
+        existing = set()
+        for start in range(0, len(ids), EXISTENCE_CHECK_BATCH):
+            batch = ids[start:start + EXISTENCE_CHECK_BATCH]
+            cursor = collection.find({"_id": {"$in": batch}}, projection={"_id": True}, limit=len(batch))
+            existing.update(document["_id"] for document in cursor)
+        return existing
 
-        collection = db.get_collection(collection_name)
+    def _index_chunks(self, lexical_index, ids: List[str], chunks: List[str], conversation_id: str, timestamp: str):
+        """
+        Adds chunks to the lexical index. Failures are logged, not raised:
+        the documents are already stored, and only hybrid search degrades.
+        """
+        if lexical_index is None:
+            return
+        try:
+            lexical_index.add(ids, chunks, conversation_id, timestamp)
+        except Exception:
+            logger.exception("Failed to update the lexical index.")
 
+    def _insert_documents(
+        self,
+        collection,
+        ids: List[str],
+        chunks: List[str],
+        embeddings,
+        conversation_id: str,
+        insert_batch_size: int = 50,
+        insert_concurrency: int = 4,
+        timestamp: str = None,
+    ) -> int:
+        """
+        Inserts one document per chunk, under its deterministic `_id`,
+        containing the chunk text and its associated embedding vector.
+        Unordered batches are sent concurrently; documents that turn out to
+        exist already count as done, so the write is an idempotent upsert.
+        """
         if len(chunks) != len(embeddings):
             raise ValueError("Mismatch between chunk count and embedding count.")
-        
-        documents = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            documents.append(
-                {
-                    "content": chunk,
-                    "conversation_id": conversation_id,
-                    "timestamp": datetime.now().isoformat(),
-                    "$vector": embedding,
-                }
-            )
 
-        insertion_result = collection.insert_many(documents)
-        logger.info(f"Inserted {len(insertion_result.inserted_ids)} items.")
-        return len(insertion_result.inserted_ids)
+        timestamp = timestamp or datetime.now().isoformat()
+        documents = [
+            {
+                "_id": doc_id,
+                "content": chunk,
+                "conversation_id": conversation_id,
+                "timestamp": timestamp,
+                "$vector": embedding.tolist(),
+            }
+            for doc_id, chunk, embedding in zip(ids, chunks, embeddings)
+        ]
 
+        try:
+            inserted_ids = collection.insert_many(
+                documents,
+                ordered=False,
+                chunk_size=insert_batch_size,
+                concurrency=insert_concurrency,
+            ).inserted_ids
+        except Exception as e:
+            if not _duplicates_only(e):
+                raise
+            inserted_ids = e.inserted_ids
+        logger.debug("Inserted %d items.", len(inserted_ids))
+        record_bytes("astradb_ingest", sum(len(chunk) for chunk in chunks), "out")
+        return len(inserted_ids)
@@ -1,17 +1,26 @@
 import json
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple
-from openai import OpenAI
-from astrapy import DataAPIClient
-import dotenv
-import logging
 
-dotenv.load_dotenv()
+from ..common.metrics import log_sampled, record_bytes, timed
+from ..common.embedder import embed_texts
+from ..common.embeddings import EMBEDDING_TYPE, coerce_embedding
+from .astra_handles import collection_scope, get_astra_collection, invalidate_astra_collection
+from .lexical_index import get_lexical_index, reciprocal_rank_fusion
+from .local_store import BACKENDS, get_local_collection
+from .memory_cache import get_memory_cache, make_message
+from .quantization import QUANTIZATION_MODES
+import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SEARCH_MODES = ["vector", "hybrid", "memory"]
+
+# Each retriever contributes this many candidates per requested result
+# before reciprocal rank fusion picks the final top_k
+HYBRID_CANDIDATE_FACTOR = 3
+
 #####################
 # Astra + OpenAI Node
 #####################
@@ -32,6 +41,16 @@ class AstraOpenAISearchNode:
                 "collection_name": ("STRING", {"multiline": False, "default": ""}),
                 "conversation_id": ("STRING", {"multiline": False, "default": ""}),
             },
+            "optional": {
+                "top_k": ("INT", {"default": 10, "min": 1, "max": 1000}),
+                "min_content_length": ("INT", {"default": 31, "min": 0, "max": 100000}),
+                "backend": (BACKENDS, ),
+                "search_mode": (SEARCH_MODES, ),
+                "memory_token_budget": ("INT", {"default": 2000, "min": 1, "max": 128000}),
+                "quantization": (QUANTIZATION_MODES, ),
+                "rescore_factor": ("INT", {"default": 4, "min": 1, "max": 100}),
+                "query_embedding": (EMBEDDING_TYPE, ),  # Precomputed query vector, e.g. from OpenAIEmbedding
+            }
         }
 
     # ComfyUI expects you to define what the node returns
@@ -39,82 +58,270 @@ class AstraOpenAISearchNode:
     FUNCTION = "search_astra"
     CATEGORY = "Astra / Search"  # or whatever category you prefer
 
+    @timed("astradb_search")
     def search_astra(
         self,
         search_query: str,
         astradb_token: str,
         astradb_endpoint: str,
         collection_name: str,
-        conversation_id: str
+        conversation_id: str,
+        top_k: int = 10,
+        min_content_length: int = 31,
+        backend: str = "astradb",
+        search_mode: str = "vector",
+        memory_token_budget: int = 2000,
+        quantization: str = "none",
+        rescore_factor: int = 4,
+        query_embedding=None,
     ) -> Tuple[str]:
         """
         Main function for the node. Generates an embedding using OpenAI, 
         then sends the embedding to Astra DB to do a similarity search.
-        Returns the JSON string of search results.
+        Returns the JSON string of the `top_k` closest documents, most
+        similar first. An empty query returns the most recent documents.
+
+        In "hybrid" mode the vector search and a BM25 lookup in the local
+        lexical index run concurrently, and their rankings are merged with
+        reciprocal rank fusion; each result then also carries its fused
+        "score".
+
+        With the local backend, `quantization` shortlists candidates on
+        int8 or binary codes and rescores `top_k * rescore_factor` of them
+        exactly; Astra DB ignores both.
+
+        A `query_embedding` (the first row is used) replaces embedding
+        `search_query`; the query text is then only used by hybrid search.
+
+        In "memory" mode the query is ignored and the newest messages of
+        the conversation are returned, newest first, up to `top_k`
+        messages and `memory_token_budget` tokens.
         """
-        # embedding = self._generate_openai_embedding(search_query)
-        embedding = []
-
-        results = self._search_astra_by_embedding(
-            astradb_token, 
-            astradb_endpoint, 
-            collection_name, 
-            embedding,
-            conversation_id
-            # keyspace,
-            # top_k
-        )
+        if search_mode == "memory":
+            messages = self._recent_messages(
+                astradb_token, astradb_endpoint, collection_name, conversation_id,
+                top_k, memory_token_budget, min_content_length, backend,
+            )
+            return (json.dumps(messages),)
+
+        openai_api_key = None
+        precomputed = None
+        if query_embedding is not None:
+            try:
+                precomputed = coerce_embedding(query_embedding)[0].tolist()
+            except Exception as e:
+                return (f"Invalid query embedding: {e}",)
+        elif search_query.strip():
+            openai_api_key = os.environ.get("OPENAI_API_KEY")
+
+            if not openai_api_key:
+                logger.info("OpenAI API key not set")
+                return ("OpenAI API key not set",)
+
+        def vector_search(limit):
+            if precomputed is not None:
+                embedding = precomputed
+            else:
+                embedding = self._generate_openai_embedding(search_query, openai_api_key) if openai_api_key else None
+            return self._search_astra_by_embedding(
+                astradb_token, 
+                astradb_endpoint, 
+                collection_name, 
+                embedding,
+                conversation_id,
+                top_k=limit,
+                min_content_length=min_content_length,
+                backend=backend,
+                quantization=quantization,
+                rescore_factor=rescore_factor,
+            )
+
+        lexical_index = get_lexical_index(backend, astradb_endpoint, collection_name) if search_mode == "hybrid" else None
+        if lexical_index is not None and search_query.strip() and (openai_api_key or precomputed is not None):
+            candidates = top_k * HYBRID_CANDIDATE_FACTOR
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                vector_future = executor.submit(vector_search, candidates)
+                lexical_future = executor.submit(self._lexical_search, lexical_index, search_query, conversation_id, candidates, min_content_length)
+                results = reciprocal_rank_fusion([vector_future.result(), lexical_future.result()], limit=top_k)
+        else:
+            results = vector_search(top_k)
         
-        search_output = [
-            {
+        search_output = []
+        for result in results:
+            entry = {
                 "content": result.get("content"),
                 "timestamp": result.get("timestamp"),
+                "similarity": result.get("$similarity"),
             }
-            for result in results if len(result.get("content")) > 30
-        ]
-            
-        sorted_search_output = sorted(search_output, key=lambda x: x["timestamp"], reverse=True)
+            if "rrf_score" in result:
+                entry["score"] = result["rrf_score"]
+            search_output.append(entry)
         
-        return (json.dumps(sorted_search_output),)
+        return (json.dumps(search_output),)
 
-    def _generate_openai_embedding(self, text: str, embedding_model: str = "text-embedding-3-small"):
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-        
-        if not openai_api_key:
-            logger.info("OpenAI API key not set")
-            return "OpenAI API key not set"
-        
-        client = OpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
+    def _recent_messages(
+        self,
+        astradb_token: str,
+        astradb_endpoint: str,
+        collection_name: str,
+        conversation_id: str,
+        max_messages: int,
+        token_budget: int,
+        min_content_length: int = 31,
+        backend: str = "astradb",
+        keyspace: str = "",
+    ):
+        """
+        Returns the newest messages that fit in `token_budget`, newest
+        first. Served from the per-conversation window cache when it holds
+        enough history; otherwise the cursor is read newest-first with a
+        server-side limit and projection, and abandoned as soon as the
+        budget is full.
+        """
+        cache = get_memory_cache()
+        scope = collection_scope(backend, astradb_endpoint, collection_name)
+
+        window = cache.get(scope, conversation_id)
+        if window is not None:
+            selected, filled = self._fill_window(window.messages, max_messages, token_budget, min_content_length)
+            if filled or window.complete:
+                return selected
+
+        if backend == "local":
+            collection = get_local_collection(collection_name)
+        else:
+            collection = get_astra_collection(astradb_token, astradb_endpoint, collection_name, keyspace)
+
+        # Over-fetch a little for the short messages that get dropped
+        fetch_limit = min(1000, max_messages * 2) if min_content_length > 0 else max_messages
+        cursor = collection.find(
+            {"conversation_id": conversation_id},
+            projection={"content": True, "timestamp": True},
+            sort={"timestamp": -1},
+            limit=fetch_limit,
         )
-        
+
+        fetched = []
+        used_tokens = 0
+        kept = 0
+        exhausted = True
+        try:
+            for document in cursor:
+                message = make_message(document.get("content") or "", document.get("timestamp"))
+                fetched.append(message)
+                if len(message["content"]) < min_content_length:
+                    continue
+                used_tokens += message["tokens"]
+                kept += 1
+                if used_tokens >= token_budget or kept >= max_messages:
+                    exhausted = False
+                    break
+        except Exception:
+            if backend != "local":
+                invalidate_astra_collection(astradb_token, astradb_endpoint, collection_name, keyspace)
+            raise
+        finally:
+            close = getattr(cursor, "close", None)
+            if close is not None:
+                close()
+
+        # Hitting the server-side limit does not prove there is no more history
+        complete = exhausted and len(fetched) < fetch_limit
+        cache.put(scope, conversation_id, fetched, complete)
+        record_bytes("astradb_search", sum(len(message["content"]) for message in fetched))
+
+        selected, _ = self._fill_window(fetched, max_messages, token_budget, min_content_length)
+        return selected
+
+    def _fill_window(self, messages, max_messages: int, token_budget: int, min_content_length: int):
+        """
+        Takes messages newest first until `max_messages` or `token_budget`
+        is reached. The message that crosses the budget is left out. Returns
+        (selected, filled) where `filled` says a limit was reached.
+        """
+        selected = []
+        used_tokens = 0
+        for message in messages:
+            if len(message["content"]) < min_content_length:
+                continue
+            if used_tokens + message["tokens"] > token_budget or len(selected) >= max_messages:
+                return selected, True
+            used_tokens += message["tokens"]
+            selected.append({"content": message["content"], "timestamp": message["timestamp"]})
+        return selected, len(selected) >= max_messages
+
+    def _lexical_search(self, lexical_index, query: str, conversation_id: str, limit: int, min_content_length: int):
+        """
+        BM25 lookup in the local lexical index, best first.
+        """
+        # Over-fetch like the vector search does, since short chunks are dropped
+        results = lexical_index.search(query, conversation_id, limit * 2 if min_content_length > 0 else limit)
+        return [result for result in results if len(result["content"]) >= min_content_length][:limit]
+
+    def _generate_openai_embedding(self, text: str, api_key: str, embedding_model: str = "text-embedding-3-small"):
         text = text.replace("\n", " ")
-        return client.embeddings.create(input=[text], model=embedding_model).data[0].embedding
+        return embed_texts(api_key, embedding_model, [text], node="astradb_search")[0].tolist()
 
     def _search_astra_by_embedding(
         self,
         astradb_token: str,
         astradb_endpoint: str,
         collection_name: str,
-        query_embedding: list,
+        query_embedding,
         conversation_id: str,
         keyspace: str = "",
-        # top_k: int = 4
+        top_k: int = 10,
+        min_content_length: int = 31,
+        backend: str = "astradb",
+        quantization: str = "none",
+        rescore_factor: int = 4,
     ):
-        client = DataAPIClient(astradb_token)
-        db = client.get_database_by_api_endpoint(astradb_endpoint)
-        
-        collection = db.get_collection(collection_name)
-        
-        results = collection.find(
-          {"conversation_id": conversation_id},
-          sort={"timestamp": -1},
-        )
-        
+        """
+        Runs the top-k query on the server: the conversation filter, the
+        vector sort, the limit and a projection down to the returned fields.
+        The Data API has no string-length operator, so short documents are
+        dropped client-side; the query over-fetches a little to make up for
+        them and the cursor stops as soon as `top_k` documents are found.
+        """
+        search_options = {}
+        if backend == "local":
+            collection = get_local_collection(collection_name)
+            search_options = {"quantization": quantization, "rescore_factor": rescore_factor}
+        else:
+            collection = get_astra_collection(astradb_token, astradb_endpoint, collection_name, keyspace)
+
+        fetch_limit = min(1000, top_k * 2) if min_content_length > 0 else top_k
+        if query_embedding is not None:
+            cursor = collection.find(
+                {"conversation_id": conversation_id},
+                projection={"content": True, "timestamp": True},
+                sort={"$vector": query_embedding},
+                limit=fetch_limit,
+                include_similarity=True,
+                **search_options,
+            )
+        else:
+            cursor = collection.find(
+                {"conversation_id": conversation_id},
+                projection={"content": True, "timestamp": True},
+                sort={"timestamp": -1},
+                limit=fetch_limit,
+            )
+
         result_list = []
-        for result in results:
-            logger.info(f"Found document: {result}")
-            result_list.append(result)
+        try:
+            for result in cursor:
+                if len(result.get("content") or "") < min_content_length:
+                    continue
+                result_list.append(result)
+                if len(result_list) >= top_k:
+                    break
+        except Exception:
+            if backend != "local":
+                invalidate_astra_collection(astradb_token, astradb_endpoint, collection_name, keyspace)
+            raise
+        
+        record_bytes("astradb_search", sum(len(result.get("content") or "") for result in result_list))
+        log_sampled(logger, "Found %d documents", len(result_list))
         
         return result_list
-        
\ No newline at end of file
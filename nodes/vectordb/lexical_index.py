@@ -0,0 +1,146 @@
+"""
+Local BM25 index over ingested chunks, for hybrid search.
+
+Embeddings retrieve exact terms (product SKUs, names, error codes) poorly,
+so every chunk the ingest node writes is also added to a small SQLite FTS5
+index, one file per (backend, endpoint, collection). FTS5 keeps an
+inverted index and ranks with BM25; inserts are incremental. Hyphens and
+underscores are kept inside tokens so identifiers like "AB-1234" or
+"E_CONN_REFUSED" stay whole. Set `FLOWSCALE_LEXICAL_INDEX=0` to disable it.
+"""
+
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List
+
+from ..common.response_cache import CACHE_DIR
+from .astra_handles import collection_scope
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_ENABLED = os.environ.get("FLOWSCALE_LEXICAL_INDEX", "1").lower() not in ("0", "false", "no", "off")
+LEXICAL_INDEX_DIR = os.environ.get("FLOWSCALE_LEXICAL_INDEX_DIR", os.path.join(CACHE_DIR, "lexical"))
+
+_QUERY_TERM = re.compile(r"[\w\-]+", re.UNICODE)
+
+
+def build_match_query(text: str) -> str:
+    """
+    Turns free text into an FTS5 query that matches any of its terms; BM25
+    then ranks documents matching more (and rarer) terms first.
+    """
+    terms = dict.fromkeys(term.lower() for term in _QUERY_TERM.findall(text or "") if term.strip("-"))
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class LexicalIndex:
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                conversation_id TEXT,
+                timestamp TEXT,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_conversation ON docs (conversation_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+                content, content='docs', content_rowid='rowid', tokenize="unicode61 tokenchars '-_'"
+            );
+            CREATE TRIGGER IF NOT EXISTS docs_after_insert AFTER INSERT ON docs BEGIN
+                INSERT INTO docs_fts (rowid, content) VALUES (new.rowid, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_after_delete AFTER DELETE ON docs BEGIN
+                INSERT INTO docs_fts (docs_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            END;
+            """
+        )
+        self._conn.commit()
+
+    def add(self, ids: List[str], contents: List[str], conversation_id: str, timestamp: str):
+        """
+        Indexes chunks; ids that are already indexed are left unchanged.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO docs (id, conversation_id, timestamp, content) VALUES (?, ?, ?, ?)",
+                [(doc_id, conversation_id, timestamp, content) for doc_id, content in zip(ids, contents)],
+            )
+            self._conn.commit()
+
+    def search(self, query: str, conversation_id: str = None, limit: int = 10) -> List[dict]:
+        """
+        Returns up to `limit` documents ranked by BM25, best first, as
+        {"_id", "content", "timestamp", "score"} with higher scores better.
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT docs.id, docs.content, docs.timestamp, bm25(docs_fts) AS rank "
+            "FROM docs_fts JOIN docs ON docs.rowid = docs_fts.rowid WHERE docs_fts MATCH ?"
+        )
+        params = [match]
+        if conversation_id is not None:
+            sql += " AND docs.conversation_id = ?"
+            params.append(conversation_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        # FTS5 reports BM25 negated so that ascending order is best first
+        return [
+            {"_id": doc_id, "content": content, "timestamp": timestamp, "score": -rank}
+            for doc_id, content, timestamp, rank in rows
+        ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(backend: str, endpoint: str, collection_name: str):
+    """
+    Returns the process-wide index for a collection, or None if lexical
+    indexing is disabled or the index cannot be opened.
+    """
+    if not LEXICAL_INDEX_ENABLED:
+        return None
+    scope = collection_scope(backend, endpoint, collection_name)
+    with _indexes_lock:
+        index = _indexes.get(scope)
+        if index is None:
+            name = hashlib.sha256(scope.encode("utf-8")).hexdigest()[:32]
+            try:
+                index = LexicalIndex(os.path.join(LEXICAL_INDEX_DIR, f"{name}.sqlite3"))
+            except Exception:
+                logger.exception("Failed to open lexical index; continuing without it.")
+                return None
+            _indexes[scope] = index
+        return index
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], k: int = 60, limit: int = 10) -> List[dict]:
+    """
+    Merges ranked lists of documents (matched by `_id`) with reciprocal
+    rank fusion: each document scores sum(1 / (k + rank)) over the lists it
+    appears in. The first list's copy of a document wins on conflicts.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            entry = fused.setdefault(document["_id"], {"document": document, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:limit]
+    return [{**entry["document"], "rrf_score": entry["score"]} for entry in ranked]
@@ -0,0 +1,465 @@
+"""
+In-process vector store with the subset of the astrapy Collection API the
+vectordb nodes use (`insert_many` and `find`), so they can run against a
+local directory instead of a remote Astra DB.
+
+Each collection is a directory holding:
+  - vectors.f32: an append-only file of unit-normalized float32 rows, read
+    through a memory map;
+  - index.sqlite3: a metadata sidecar mapping each document `_id` to its
+    row, its JSON body (without `$vector`) and its IVF list;
+  - centroids.npy: IVF centroids, once the collection is large enough;
+  - codes.i8 / scales.f32 and codes.bits: int8 and binary codes of every
+    row (see quantization.py), for searches that shortlist on the codes
+    and rescore only the shortlist against vectors.f32.
+
+Vectors are written and flushed before the metadata rows that point to
+them are committed, and the sidecar runs in WAL mode, so readers never
+block on (or observe half of) an append. Small or well-filtered candidate
+sets are searched exactly with NumPy; above `FLOWSCALE_VECTOR_IVF_THRESHOLD`
+documents an IVF index is trained with k-means and only the
+`FLOWSCALE_VECTOR_IVF_NPROBE` nearest lists are scanned. Similarity is
+cosine, reported like Astra's `$similarity` in [0, 1].
+"""
+
+import os
+import re
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Iterator, List
+
+import numpy as np
+
+from ..common.response_cache import CACHE_DIR
+from .quantization import binary_codes, hamming_distances, int8_scores, quantize_int8
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORE_DIR = os.environ.get("FLOWSCALE_VECTOR_STORE_DIR", os.path.join(CACHE_DIR, "vectors"))
+IVF_THRESHOLD = int(os.environ.get("FLOWSCALE_VECTOR_IVF_THRESHOLD", "20000"))
+IVF_NPROBE = int(os.environ.get("FLOWSCALE_VECTOR_IVF_NPROBE", "16"))
+QUANTIZATION = os.environ.get("FLOWSCALE_VECTOR_QUANTIZATION", "none")
+RESCORE_FACTOR = int(os.environ.get("FLOWSCALE_VECTOR_RESCORE_FACTOR", "4"))
+
+BACKENDS = ["astradb", "local"]
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+_SCORE_BLOCK = 65536
+_DEFAULT_LIMIT = 1000
+_VALID_NAME = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+class LocalInsertResult:
+
+    def __init__(self, inserted_ids: List[str]):
+        self.inserted_ids = inserted_ids
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def _field(name: str) -> str:
+    if name == "_id":
+        return "id"
+    if not re.match(r"^[A-Za-z0-9_]+$", name):
+        raise ValueError(f"Unsupported filter field: {name}")
+    return f"json_extract(doc, '$.{name}')"
+
+
+def _where(filter: dict):
+    """
+    Translates a Data API style filter (equality, `$eq`, `$ne`, `$in`,
+    `$nin` on top-level fields, AND-ed together) into SQL.
+    """
+    clauses, params = [], []
+    for name, condition in (filter or {}).items():
+        column = _field(name)
+        operators = condition if isinstance(condition, dict) else {"$eq": condition}
+        for operator, value in operators.items():
+            if operator == "$eq":
+                clauses.append(f"{column} = ?")
+                params.append(value)
+            elif operator == "$ne":
+                clauses.append(f"({column} IS NULL OR {column} != ?)")
+                params.append(value)
+            elif operator in ("$in", "$nin"):
+                values = list(value)
+                if not values:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                negate = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{column} {negate}IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+    return (" AND ".join(clauses) or "1"), params
+
+
+def _project(document: dict, projection) -> dict:
+    if not projection:
+        return document
+    included = {name for name, keep in projection.items() if keep}
+    if included:
+        return {name: value for name, value in document.items() if name in included or name in ("_id", "$similarity")}
+    excluded = {name for name, keep in projection.items() if not keep}
+    return {name: value for name, value in document.items() if name not in excluded}
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means over unit vectors; returns unit-norm centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class LocalCollection:
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.nprobe = IVF_NPROBE
+        self.ivf_threshold = IVF_THRESHOLD
+        self._write_lock = threading.Lock()
+        self._map_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._int8_path = os.path.join(directory, "codes.i8")
+        self._scales_path = os.path.join(directory, "scales.f32")
+        self._bits_path = os.path.join(directory, "codes.bits")
+        self._centroids_path = os.path.join(directory, "centroids.npy")
+        self._db_path = os.path.join(directory, "index.sqlite3")
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                list_id INTEGER,
+                doc TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS docs_conversation ON docs "
+            "(json_extract(doc, '$.conversation_id'), json_extract(doc, '$.timestamp'))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS docs_list ON docs (list_id)")
+        conn.commit()
+
+        self.dims = int(self._meta("dims") or 0)
+        self._maps = {}
+        self._centroids = None
+        self._centroids_mtime = None
+        for path in self._row_files():
+            open(path, "ab").close()
+        if self.dims:
+            self._repair_codes()
+
+    def _conn(self):
+        # One connection per thread, so readers never share a transaction
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key: str):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _row_files(self) -> dict:
+        """
+        {path: (dtype, values per row)} for every file with one row per vector.
+        """
+        return {
+            self._vectors_path: (np.float32, self.dims),
+            self._int8_path: (np.int8, self.dims),
+            self._scales_path: (np.float32, 1),
+            self._bits_path: (np.uint8, (self.dims + 7) // 8),
+        }
+
+    def _file_rows(self, path: str) -> int:
+        dtype, width = self._row_files()[path]
+        row_bytes = np.dtype(dtype).itemsize * width
+        return os.path.getsize(path) // row_bytes if row_bytes else 0
+
+    def _repair_codes(self):
+        """
+        Drops partially written rows left by an interrupted append, and
+        (re)builds the codes of vectors written without them.
+        """
+        for path, (dtype, width) in self._row_files().items():
+            row_bytes = np.dtype(dtype).itemsize * width
+            size = os.path.getsize(path)
+            if size % row_bytes:
+                os.truncate(path, size - size % row_bytes)
+
+        rows = self._file_rows(self._vectors_path)
+        code_rows = min(self._file_rows(path) for path in (self._int8_path, self._scales_path, self._bits_path))
+        if code_rows >= rows:
+            return
+        for path, (dtype, width) in self._row_files().items():
+            if path != self._vectors_path:
+                os.truncate(path, code_rows * np.dtype(dtype).itemsize * width)
+        vectors = self._mapped(self._vectors_path, rows)
+        for start in range(code_rows, rows, _SCORE_BLOCK):
+            self._append_codes(np.asarray(vectors[start:start + _SCORE_BLOCK]))
+        logger.info(f"Built vector codes for {rows - code_rows} rows in {self.directory}")
+
+    def _append_codes(self, vectors: np.ndarray):
+        codes, scales = quantize_int8(vectors)
+        for path, data in ((self._int8_path, codes), (self._scales_path, scales), (self._bits_path, binary_codes(vectors))):
+            with open(path, "ab") as out:
+                out.write(np.ascontiguousarray(data).tobytes())
+                out.flush()
+
+    def _mapped(self, path: str, min_rows: int = 0) -> np.ndarray:
+        # Remap only when rows beyond the current map are needed
+        dtype, width = self._row_files()[path]
+        with self._map_lock:
+            mapped = self._maps.get(path)
+            if mapped is None or len(mapped) < min_rows:
+                rows = self._file_rows(path) if self.dims else 0
+                if rows:
+                    mapped = np.memmap(path, dtype=dtype, mode="r", shape=(rows, width))
+                else:
+                    mapped = np.empty((0, width), dtype=dtype)
+                self._maps[path] = mapped
+            return mapped
+
+    def _vectors(self, min_rows: int = 0) -> np.ndarray:
+        return self._mapped(self._vectors_path, min_rows)
+
+    def _load_centroids(self):
+        try:
+            mtime = os.path.getmtime(self._centroids_path)
+        except OSError:
+            return None
+        if mtime != self._centroids_mtime:
+            self._centroids = np.load(self._centroids_path)
+            self._centroids_mtime = mtime
+        return self._centroids
+
+    def count_documents(self, filter: dict = None) -> int:
+        where, params = _where(filter)
+        return self._conn().execute(f"SELECT COUNT(*) FROM docs WHERE {where}", params).fetchone()[0]
+
+    def insert_many(self, documents: list, ordered: bool = False, chunk_size: int = None, concurrency: int = None) -> LocalInsertResult:
+        """
+        Stores documents with a `$vector` field. A document whose `_id`
+        already exists replaces it. `ordered`, `chunk_size` and
+        `concurrency` are accepted for API compatibility; the write is one
+        local transaction.
+        """
+        if not documents:
+            return LocalInsertResult([])
+
+        vectors = _normalize([document["$vector"] for document in documents])
+        with self._write_lock:
+            conn = self._conn()
+            if not self.dims:
+                self.dims = vectors.shape[1]
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dims', ?)", (str(self.dims),))
+            elif vectors.shape[1] != self.dims:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match collection dimension {self.dims}.")
+
+            centroids = self._load_centroids()
+            list_ids = np.argmax(vectors @ centroids.T, axis=1).tolist() if centroids is not None else [None] * len(documents)
+
+            with open(self._vectors_path, "ab") as blob:
+                first_row = blob.tell() // (self.dims * 4)
+                blob.write(vectors.tobytes())
+                blob.flush()
+            self._append_codes(vectors)
+
+            rows, inserted_ids = [], []
+            for offset, (document, list_id) in enumerate(zip(documents, list_ids)):
+                doc_id = str(document.get("_id") or uuid.uuid4().hex)
+                body = {name: value for name, value in document.items() if name not in ("_id", "$vector")}
+                rows.append((doc_id, first_row + offset, list_id, json.dumps(body)))
+                inserted_ids.append(doc_id)
+
+            conn.executemany("INSERT OR REPLACE INTO docs (id, row, list_id, doc) VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+            self._maybe_build_index_locked()
+        return LocalInsertResult(inserted_ids)
+
+    def _maybe_build_index_locked(self):
+        conn = self._conn()
+        count = conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        built_count = int(self._meta("ivf_built_count") or 0)
+        if count < self.ivf_threshold or (built_count and count < 2 * built_count):
+            return
+
+        rows = np.array([row for row, in conn.execute("SELECT row FROM docs ORDER BY row")], dtype=np.int64)
+        vectors = self._vectors(int(rows[-1]) + 1)
+        clusters = int(min(4096, max(16, np.sqrt(count))))
+        sample = np.sort(np.random.default_rng(0).choice(rows, min(len(rows), clusters * 64), replace=False))
+        centroids = _kmeans(np.asarray(vectors[sample]), clusters)
+
+        assignments = []
+        for start in range(0, len(rows), _SCORE_BLOCK):
+            block = rows[start:start + _SCORE_BLOCK]
+            lists = np.argmax(np.asarray(vectors[block]) @ centroids.T, axis=1)
+            assignments.extend(zip(lists.tolist(), block.tolist()))
+        conn.executemany("UPDATE docs SET list_id = ? WHERE row = ?", assignments)
+
+        tmp_path = self._centroids_path + ".tmp.npy"
+        np.save(tmp_path, centroids)
+        os.replace(tmp_path, self._centroids_path)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ivf_built_count', ?)", (str(count),))
+        conn.commit()
+        logger.info(f"Built IVF index with {clusters} lists over {count} vectors in {self.directory}")
+
+    def find(self, filter: dict = None, *, projection: dict = None, sort: dict = None, limit: int = None, include_similarity: bool = False,
+             quantization: str = None, rescore_factor: int = None) -> Iterator[dict]:
+        """
+        Returns matching documents. `sort` is either {"$vector": [...]} for
+        a nearest-neighbour search or {field: 1 | -1}. For vector searches,
+        `quantization` ("none", "int8" or "binary") shortlists
+        `limit * rescore_factor` candidates on the compact codes before
+        exact rescoring; a larger factor gives better recall.
+        """
+        if sort and "$vector" in sort:
+            return iter(self._vector_search(
+                filter, sort["$vector"], limit or _DEFAULT_LIMIT, projection, include_similarity,
+                quantization or QUANTIZATION, rescore_factor or RESCORE_FACTOR,
+            ))
+        return self._scan(filter, sort, limit, projection)
+
+    def _scan(self, filter, sort, limit, projection) -> Iterator[dict]:
+        where, params = _where(filter)
+        order = ", ".join(
+            f"{_field(name)} {'DESC' if direction < 0 else 'ASC'}" for name, direction in (sort or {}).items()
+        )
+        query = f"SELECT id, doc FROM docs WHERE {where}"
+        if order:
+            query += f" ORDER BY {order}"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        for doc_id, body in self._conn().execute(query, params):
+            yield _project({"_id": doc_id, **json.loads(body)}, projection)
+
+    def _candidates(self, filter, query: np.ndarray):
+        """
+        Returns (ids, rows) to score: every match for an exact search, or
+        only those in the nearest IVF lists once the index exists and the
+        filter leaves more than `ivf_threshold` documents.
+        """
+        where, params = _where(filter)
+        conn = self._conn()
+        centroids = self._load_centroids()
+        if centroids is not None and self.count_documents(filter) > self.ivf_threshold:
+            probe = np.argsort(-(centroids @ query))[: max(1, self.nprobe)].tolist()
+            where += f" AND (list_id IS NULL OR list_id IN ({','.join('?' * len(probe))}))"
+            params = params + probe
+        rows = conn.execute(f"SELECT id, row FROM docs WHERE {where}", params).fetchall()
+        return [row[0] for row in rows], np.array([row[1] for row in rows], dtype=np.int64)
+
+    def _shortlist(self, rows: np.ndarray, query: np.ndarray, size: int, quantization: str) -> np.ndarray:
+        """
+        Returns the positions in `rows` of the `size` best candidates by
+        approximate score on the int8 or binary codes.
+        """
+        max_row = int(rows.max()) + 1
+        if quantization == "int8":
+            codes, scales = self._mapped(self._int8_path, max_row), self._mapped(self._scales_path, max_row)
+            approx = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), _SCORE_BLOCK):
+                block = rows[start:start + _SCORE_BLOCK]
+                approx[start:start + len(block)] = int8_scores(codes[block], scales[block, 0], query)
+            return np.argpartition(-approx, size - 1)[:size]
+        if quantization == "binary":
+            codes = self._mapped(self._bits_path, max_row)
+            query_code = binary_codes(query)[0]
+            distances = np.empty(len(rows), dtype=np.int32)
+            for start in range(0, len(rows), _SCORE_BLOCK):
+                block = rows[start:start + _SCORE_BLOCK]
+                distances[start:start + len(block)] = hamming_distances(codes[block], query_code)
+            return np.argpartition(distances, size - 1)[:size]
+        raise ValueError(f"Unsupported quantization: {quantization}")
+
+    def _vector_search(self, filter, query_vector, limit: int, projection, include_similarity: bool,
+                       quantization: str = "none", rescore_factor: int = RESCORE_FACTOR) -> List[dict]:
+        if not self.dims:
+            return []
+        query = _normalize(query_vector)[0]
+        if query.shape[0] != self.dims:
+            raise ValueError(f"Query dimension {query.shape[0]} does not match collection dimension {self.dims}.")
+
+        ids, rows = self._candidates(filter, query)
+        if not ids:
+            return []
+
+        shortlist_size = limit * max(1, rescore_factor)
+        if quantization != "none" and len(rows) > shortlist_size:
+            shortlist = self._shortlist(rows, query, shortlist_size, quantization)
+            ids, rows = [ids[index] for index in shortlist], rows[shortlist]
+        vectors = self._vectors(int(rows.max()) + 1)
+
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), _SCORE_BLOCK):
+            block = rows[start:start + _SCORE_BLOCK]
+            scores[start:start + len(block)] = np.asarray(vectors[block]) @ query
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        top_ids = [ids[index] for index in top]
+        bodies = {}
+        conn = self._conn()
+        for start in range(0, len(top_ids), _LOOKUP_CHUNK):
+            chunk = top_ids[start:start + _LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            bodies.update(conn.execute(f"SELECT id, doc FROM docs WHERE id IN ({placeholders})", chunk).fetchall())
+
+        results = []
+        for index, doc_id in zip(top, top_ids):
+            document = {"_id": doc_id, **json.loads(bodies[doc_id])}
+            if include_similarity:
+                document["$similarity"] = float((1.0 + scores[index]) / 2.0)
+            results.append(_project(document, projection))
+        return results
+
+
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def get_local_collection(collection_name: str) -> LocalCollection:
+    """
+    Returns the process-wide handle for a collection under
+    `FLOWSCALE_VECTOR_STORE_DIR`, creating the collection if needed.
+    """
+    if not collection_name or not _VALID_NAME.match(collection_name):
+        raise ValueError(f"Invalid local collection name: {collection_name!r}")
+    with _collections_lock:
+        collection = _collections.get(collection_name)
+        if collection is None:
+            collection = LocalCollection(os.path.join(VECTOR_STORE_DIR, collection_name))
+            _collections[collection_name] = collection
+        return collection
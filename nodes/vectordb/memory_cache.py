@@ -0,0 +1,97 @@
+"""
+In-process cache of recent conversation history, for chat memory.
+
+Memory retrieval only needs the newest messages of a conversation that fit
+in a token budget. The search node keeps the newest-first window it last
+read per (collection, conversation) here, and the ingest node prepends what
+it writes to the same conversation, so most turns are served without a
+database round-trip. Windows also expire after `FLOWSCALE_MEMORY_CACHE_TTL`
+seconds, which bounds staleness from writers in other processes.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List
+
+from ..common.tokens import count_tokens
+
+MEMORY_CACHE_TTL = float(os.environ.get("FLOWSCALE_MEMORY_CACHE_TTL", "300"))
+MEMORY_CACHE_CONVERSATIONS = int(os.environ.get("FLOWSCALE_MEMORY_CACHE_CONVERSATIONS", "256"))
+MEMORY_CACHE_MAX_MESSAGES = int(os.environ.get("FLOWSCALE_MEMORY_CACHE_MAX_MESSAGES", "500"))
+
+# Memory windows are budgeted in the tokens of the chat model they feed
+MEMORY_TOKEN_MODEL = "gpt-4o"
+
+
+def make_message(content: str, timestamp: str) -> dict:
+    return {"content": content, "timestamp": timestamp, "tokens": count_tokens(content, MEMORY_TOKEN_MODEL)}
+
+
+class MemoryWindow:
+    """
+    The newest messages of a conversation, newest first. `complete` means
+    the window holds the whole conversation.
+    """
+
+    def __init__(self, messages: List[dict], complete: bool):
+        self.messages = messages
+        self.complete = complete
+        self.created = time.monotonic()
+
+
+class ConversationMemoryCache:
+
+    def __init__(self, max_conversations: int = MEMORY_CACHE_CONVERSATIONS, ttl: float = MEMORY_CACHE_TTL,
+                 max_messages: int = MEMORY_CACHE_MAX_MESSAGES):
+        self.max_conversations = max(1, max_conversations)
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, scope: str, conversation_id: str):
+        key = (scope, conversation_id)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                return None
+            if time.monotonic() - window.created > self.ttl:
+                del self._windows[key]
+                return None
+            self._windows.move_to_end(key)
+            return window
+
+    def put(self, scope: str, conversation_id: str, messages: List[dict], complete: bool):
+        key = (scope, conversation_id)
+        with self._lock:
+            self._windows[key] = MemoryWindow(list(messages[: self.max_messages]), complete and len(messages) <= self.max_messages)
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_conversations:
+                self._windows.popitem(last=False)
+
+    def prepend(self, scope: str, conversation_id: str, messages: List[dict]):
+        """
+        Adds newly written messages (newest first) to a cached window. If
+        nothing is cached for the conversation there is nothing to update.
+        """
+        key = (scope, conversation_id)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                return
+            combined = list(messages) + window.messages
+            window.messages = combined[: self.max_messages]
+            window.complete = window.complete and len(combined) <= self.max_messages
+
+    def invalidate(self, scope: str, conversation_id: str):
+        with self._lock:
+            self._windows.pop((scope, conversation_id), None)
+
+
+_cache = ConversationMemoryCache()
+
+
+def get_memory_cache() -> ConversationMemoryCache:
+    return _cache
@@ -0,0 +1,129 @@
+"""
+Measures the cold-start cost of loading the node package, the way ComfyUI
+does at boot: import time, resident memory and which heavy backends were
+pulled in. Each run uses a fresh interpreter so nothing is cached in
+sys.modules.
+
+    python scripts/bench_startup.py --runs 10
+    python scripts/bench_startup.py --json --output /bench_output.txt
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    "openai",
+    "httpx",
+    "astrapy",
+    "langchain",
+    "langchain_community",
+    "langchain_astradb",
+    "PyPDF2",
+    "tiktoken",
+    "numpy",
+    "requests",
+]
+
+# Runs in the child interpreter. Prints one JSON line with the results.
+_CHILD = r"""
+import importlib.util
+import json
+import sys
+import time
+
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+package_dir, heavy = sys.argv[1], sys.argv[2].split(",")
+rss_before = rss_bytes()
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location(
+    "flowscale_llm_nodes", package_dir + "/__init__.py", submodule_search_locations=[package_dir]
+)
+module = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = module
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - started
+
+print(json.dumps({
+    "import_seconds": elapsed,
+    "rss_bytes": rss_bytes(),
+    "rss_delta_bytes": rss_bytes() - rss_before,
+    "nodes": len(module.NODE_CLASS_MAPPINGS),
+    "loaded": [name for name in heavy if name in sys.modules],
+}))
+"""
+
+
+def run_once(package_dir: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD, package_dir, ",".join(HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the package failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs: list) -> dict:
+    times = [run["import_seconds"] for run in runs]
+    rss = [run["rss_bytes"] for run in runs]
+    return {
+        "runs": len(runs),
+        "import_seconds_median": statistics.median(times),
+        "import_seconds_min": min(times),
+        "import_seconds_max": max(times),
+        "rss_mb_median": statistics.median(rss) / (1024 * 1024),
+        "rss_delta_mb_median": statistics.median(run["rss_delta_bytes"] for run in runs) / (1024 * 1024),
+        "nodes": runs[-1]["nodes"],
+        "heavy_modules_loaded": runs[-1]["loaded"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--package-dir", default=PACKAGE_DIR)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--output", help="also append the summary to this file")
+    args = parser.parse_args()
+
+    # One warm-up run so the OS file cache does not skew the first sample
+    run_once(args.package_dir)
+    summary = summarize([run_once(args.package_dir) for _ in range(max(1, args.runs))])
+
+    if args.json:
+        text = json.dumps(summary)
+    else:
+        text = "\n".join([
+            f"runs:                {summary['runs']}",
+            f"import time median:  {summary['import_seconds_median'] * 1000:.1f} ms "
+            f"(min {summary['import_seconds_min'] * 1000:.1f}, max {summary['import_seconds_max'] * 1000:.1f})",
+            f"RSS median:          {summary['rss_mb_median']:.1f} MB (+{summary['rss_delta_mb_median']:.1f} MB from import)",
+            f"nodes registered:    {summary['nodes']}",
+            f"heavy modules:       {', '.join(summary['heavy_modules_loaded']) or 'none'}",
+        ])
+    print(text)
+    if args.output:
+        with open(args.output, "a") as out:
+            out.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
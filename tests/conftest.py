@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The repository root is a ComfyUI custom-node package; import its modules
+# as `nodes.*` without running the package __init__
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,233 @@
+"""
+Batch jobs against a local stand-in for the OpenAI files and batches
+endpoints.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from nodes.common import batch_jobs
+from nodes.llm.openai_batch_job import OpenAIBatchJob
+
+
+class BatchServer:
+    """
+    Accepts uploads and batches like the real API. A batch reports
+    `in_progress` for `polls_until_done` polls, then `final_status`. The
+    output file lists results in reverse order, and `fail_indices` go to
+    the error file.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+        self.polls_until_done = 0
+        self.final_status = "completed"
+        self.fail_indices = set()
+        self.message = lambda index, body: {"role": "assistant", "content": f"  answer {index}  "}
+        self.api_keys = []
+
+    def _batch_json(self, batch):
+        return {
+            "id": batch["id"],
+            "object": "batch",
+            "endpoint": batch["endpoint"],
+            "input_file_id": batch["input_file_id"],
+            "completion_window": "24h",
+            "created_at": 0,
+            "status": batch["status"],
+            "output_file_id": batch.get("output_file_id"),
+            "error_file_id": batch.get("error_file_id"),
+            "request_counts": {"total": len(batch["requests"]), "completed": 0, "failed": 0},
+        }
+
+    def _finish(self, batch):
+        batch["status"] = self.final_status
+        if self.final_status != "completed":
+            return
+        output, errors = [], []
+        for request in reversed(batch["requests"]):
+            index = int(request["custom_id"].rsplit("-", 1)[1])
+            if index in self.fail_indices:
+                errors.append({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 400, "body": {"error": {"message": "bad request"}}},
+                    "error": None,
+                })
+            elif request["url"] == "/v1/embeddings":
+                output.append({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": {"data": [{"embedding": [float(index), 1.0]}]}},
+                    "error": None,
+                })
+            else:
+                output.append({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": {"choices": [{"message": self.message(index, request["body"])}]}},
+                    "error": None,
+                })
+        batch["output_file_id"] = self._store("\n".join(json.dumps(line) for line in output)) if output else None
+        batch["error_file_id"] = self._store("\n".join(json.dumps(line) for line in errors)) if errors else None
+
+    def _store(self, text):
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = text
+        return file_id
+
+    def handle(self, method, path, body, headers):
+        self.api_keys.append(headers.get("Authorization"))
+        if method == "POST" and path == "/v1/files":
+            # Pull the JSONL payload out of the multipart upload
+            lines = [line for line in body.decode("utf-8").splitlines() if line.startswith('{"custom_id"')]
+            file_id = self._store("\n".join(lines))
+            return 200, {"id": file_id, "object": "file", "bytes": len(body), "created_at": 0,
+                         "filename": "input.jsonl", "purpose": "batch", "status": "processed"}
+        if method == "POST" and path == "/v1/batches":
+            request = json.loads(body)
+            batch = {
+                "id": f"batch_{len(self.batches) + 1}",
+                "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "status": "validating",
+                "polls": 0,
+                "requests": [json.loads(line) for line in self.files[request["input_file_id"]].splitlines()],
+            }
+            self.batches[batch["id"]] = batch
+            return 200, self._batch_json(batch)
+        if method == "GET" and path.startswith("/v1/batches/"):
+            batch = self.batches[path.rsplit("/", 1)[1]]
+            if batch["status"] not in batch_jobs.TERMINAL_STATUSES:
+                batch["polls"] += 1
+                if batch["polls"] > self.polls_until_done:
+                    self._finish(batch)
+                else:
+                    batch["status"] = "in_progress"
+            return 200, self._batch_json(batch)
+        if method == "GET" and path.startswith("/v1/files/") and path.endswith("/content"):
+            return 200, self.files[path.split("/")[3]]
+        return 404, {"error": {"message": f"no route for {method} {path}"}}
+
+
+@pytest.fixture
+def server():
+    state = BatchServer()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            status, payload = state.handle(method, self.path, self.rfile.read(length), self.headers)
+            data = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/octet-stream" if isinstance(payload, str) else "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    state.base_url = f"http://127.0.0.1:{httpd.server_address[1]}/v1"
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_jobs, "BATCH_STATE_DIR", str(tmp_path / "batches"))
+    return tmp_path / "batches"
+
+
+def make_client(server, api_key="sk-test"):
+    return openai.OpenAI(api_key=api_key, base_url=server.base_url, max_retries=0)
+
+
+BODIES = [{"model": "gpt-4o-mini", "messages": [{"role": "user", "content": f"prompt {index}"}]} for index in range(5)]
+
+
+def test_submit_maps_results_to_input_order(server):
+    server.fail_indices = {3}
+
+    state, results = batch_jobs.run_batch_job(make_client(server), "/v1/chat/completions", BODIES, max_wait=5, poll_interval=0.01)
+
+    assert state["status"] == "completed"
+    assert len(server.batches) == 1
+    assert [result["body"]["choices"][0]["message"]["content"] if result["body"] else None for result in results] == [
+        "  answer 0  ", "  answer 1  ", "  answer 2  ", None, "  answer 4  ",
+    ]
+    assert results[3]["error"].startswith("Error during API call")
+
+
+def test_resumes_pending_batch_after_restart(server):
+    server.polls_until_done = 2
+
+    state, results = batch_jobs.run_batch_job(make_client(server), "/v1/chat/completions", BODIES, max_wait=0)
+    assert results is None
+    assert state["status"] == "in_progress"
+    assert batch_jobs.list_pending_jobs()[0]["batch_id"] == state["batch_id"]
+
+    # A fresh client stands in for a restarted process; only the state file survives
+    state, results = batch_jobs.run_batch_job(make_client(server), "/v1/chat/completions", BODIES, max_wait=5, poll_interval=0.01)
+    assert len(server.batches) == 1
+    assert state["status"] == "completed"
+    assert results[0]["body"]["choices"][0]["message"]["content"] == "  answer 0  "
+    assert batch_jobs.list_pending_jobs() == []
+
+
+def test_does_not_resume_batch_of_another_account(server):
+    server.polls_until_done = 2
+    batch_jobs.run_batch_job(make_client(server, "sk-one"), "/v1/chat/completions", BODIES, max_wait=0)
+    batch_jobs.run_batch_job(make_client(server, "sk-two"), "/v1/chat/completions", BODIES, max_wait=0)
+
+    assert len(server.batches) == 2
+
+
+@pytest.mark.parametrize("final_status", ["failed", "expired"])
+def test_failed_or_expired_batch_is_resubmitted(server, final_status):
+    server.final_status = final_status
+
+    state, results = batch_jobs.run_batch_job(make_client(server), "/v1/chat/completions", BODIES, max_wait=5, poll_interval=0.01)
+    assert results is None
+    assert state["status"] == final_status
+
+    server.final_status = "completed"
+    state, results = batch_jobs.run_batch_job(make_client(server), "/v1/chat/completions", BODIES, max_wait=5, poll_interval=0.01)
+    assert len(server.batches) == 2
+    assert state["status"] == "completed"
+    assert len(results) == len(BODIES)
+
+
+def test_node_handles_messages_without_content(server, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    server.message = lambda index, body: (
+        {"role": "assistant", "content": None, "refusal": "I can't help with that."} if index == 1
+        else {"role": "assistant", "content": None, "tool_calls": []} if index == 2
+        else {"role": "assistant", "content": f" answer {index} "}
+    )
+
+    responses, status = OpenAIBatchJob().run_batch(
+        "gpt-4o-mini", "You are a helpful assistant.", "one\ntwo\nthree", "text",
+        1.0, 1.0, 100, 0.0, 0.0, 5,
+    )
+
+    assert json.loads(status)["status"] == "completed"
+    assert json.loads(responses) == [
+        {"response": "answer 0", "error": None},
+        {"response": None, "error": "Refused: I can't help with that."},
+        {"response": None, "error": None},
+    ]
@@ -0,0 +1,44 @@
+"""
+Token budgets of chunks cut from text without word breaks.
+"""
+
+import random
+
+import pytest
+
+tiktoken = pytest.importorskip("tiktoken")
+
+from nodes.common import tokens
+from nodes.common.chunking import iter_chunks
+
+
+@pytest.fixture
+def byte_tokens(monkeypatch):
+    # One token per UTF-8 byte, so a CJK character is three tokens; needs
+    # no downloaded encoding files
+    encoding = tiktoken.Encoding(
+        "bytes", pat_str=r"\S+|\s+", mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={}
+    )
+    monkeypatch.setattr(tokens, "get_encoding", lambda model: encoding)
+
+
+def test_overlong_cjk_word_is_cut_by_tokens(byte_tokens):
+    rng = random.Random(1)
+    text = "".join(chr(rng.randint(0x4E00, 0x9FFF)) for _ in range(3000))
+
+    chunks = list(iter_chunks(text, chunk_tokens=100, overlap_tokens=0))
+
+    assert "".join(chunks) == text
+    assert max(tokens.count_tokens(chunk, "any") for chunk in chunks) <= 100
+
+
+def test_pieces_never_split_a_character(byte_tokens):
+    assert list(tokens.split_to_tokens("ab日本", 4, "any")) == [("ab", 2), ("日", 3), ("本", 3)]
+
+
+def test_character_estimate_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(tokens, "get_encoding", lambda model: None)
+
+    pieces = list(tokens.split_to_tokens("x" * 10, 2, "any"))
+
+    assert pieces == [("x" * 8, 2), ("xx", 1)]
@@ -0,0 +1,27 @@
+"""
+Recovery of the embedding cache from a blob that lost its tail.
+"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from nodes.common.embedding_cache import EmbeddingCache
+
+
+def test_entries_past_end_of_blob_are_misses_and_restored(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many({"a": np.ones(4), "b": np.full(4, 2.0)})
+
+    # As if the last append never reached the disk, leaving a partial float
+    os.truncate(tmp_path / cache._blob_name(), 22)
+    reopened = EmbeddingCache(str(tmp_path))
+
+    assert list(reopened.get_many(["a", "b"])) == ["a"]
+
+    reopened.put_many({"b": np.full(4, 3.0)})
+    found = reopened.get_many(["a", "b"])
+    assert found["a"].tolist() == [1.0] * 4
+    assert found["b"].tolist() == [3.0] * 4
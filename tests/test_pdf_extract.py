@@ -0,0 +1,82 @@
+"""
+Page selection and worker-process extraction of PDF text.
+"""
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from utilitynodes import pdf_extract
+from utilitynodes.pdf_extract import iter_pdf_pages, parse_page_range
+
+
+def write_pdf(path, page_count):
+    """
+    Writes a minimal PDF whose page N reads "Page number N".
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for number in range(1, page_count + 1):
+        stream = f"BT /F1 12 Tf 72 720 Td (Page number {number}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        contents = len(objects)
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {contents} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {page_count} >>"
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    path.write_bytes(data)
+    return path
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("", list(range(10))),
+    ("1-3, 5", [0, 1, 2, 4]),
+    ("8-", [7, 8, 9]),
+    ("-2", [0, 1]),
+    ("9-20", [8, 9]),
+    ("15", []),
+    ("12-", []),
+    ("3, 12-", [2]),
+])
+def test_parse_page_range(spec, expected):
+    assert parse_page_range(spec, 10) == expected
+
+
+@pytest.mark.parametrize("spec", ["0", "5-3", "a-b", "1-2-3"])
+def test_parse_page_range_rejects_malformed_input(spec):
+    with pytest.raises(ValueError):
+        parse_page_range(spec, 10)
+
+
+def test_workers_return_pages_in_order(tmp_path, caplog):
+    pdf = write_pdf(tmp_path / "doc.pdf", 40)
+
+    pages = list(iter_pdf_pages(pdf, "2-", workers=3))
+
+    assert "PDF worker failed" not in caplog.text
+
+    assert [number for number, _ in pages] == list(range(2, 41))
+    assert all(text.strip() == f"Page number {number}" for number, text in pages)
+
+
+def test_falls_back_in_process_when_workers_fail(tmp_path, monkeypatch, caplog):
+    pdf = write_pdf(tmp_path / "doc.pdf", 40)
+    monkeypatch.setattr(pdf_extract, "_WORKER_SCRIPT", str(tmp_path / "missing.py"))
+
+    pages = list(iter_pdf_pages(pdf, workers=3))
+
+    assert "PDF worker failed" in caplog.text
+    assert [number for number, _ in pages] == list(range(1, 41))
+    assert pages[-1][1].strip() == "Page number 40"
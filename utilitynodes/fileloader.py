@@ -1,8 +1,14 @@
+import os
+import logging
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from PyPDF2 import PdfReader
 import requests
 
+from .pdf_extract import iter_pdf_pages
+from ..nodes.common.metrics import record_error, timed
+
+logger = logging.getLogger(__name__)
+
 class FileLoaderNode:
     """
     A ComfyUI node for loading individual or zipped text files.
@@ -15,19 +21,24 @@ class FileLoaderNode:
                 "file_url": ("STRING", {}),
                 "silent_errors": ("BOOLEAN",),
             },
+            "optional": {
+                "page_range": ("STRING", {"default": ""}),  # PDF pages to extract, e.g. "1-5, 8, 12-"; empty for all
+                "pdf_workers": ("INT", {"default": 0, "min": 0, "max": 64}),  # 0 uses FLOWSCALE_PDF_WORKERS (2 by default)
+            }
         }
 
     RETURN_TYPES = ("STRING",)
     FUNCTION = "load_file"
     CATEGORY = "Utility"
 
-    def load_file(self, file_url, silent_errors=True):
+    @timed("file_loader")
+    def load_file(self, file_url, silent_errors=True, page_range="", pdf_workers=0):
         """
         Loads a file or processes a zip archive.
         """
-        return self._load_from_url(file_url, silent_errors)
+        return self._load_from_url(file_url, silent_errors, page_range, pdf_workers)
         
-    def _load_from_url(self, url, silent_errors):
+    def _load_from_url(self, url, silent_errors, page_range="", pdf_workers=0):
         """
         Loads data from a URL.
         """
@@ -38,38 +49,48 @@ class FileLoaderNode:
             content_type = response.headers.get("Content-Type", "")
             
             if "application/pdf" in content_type:
+                # Worker processes reopen the file by name, so it has to
+                # outlive the `with` block; it is removed once extracted
                 with NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        temp_file.write(chunk)
                     temp_path = Path(temp_file.name)
+                    try:
+                        for chunk in response.iter_content(chunk_size=1 << 20):
+                            temp_file.write(chunk)
+                    except BaseException:
+                        temp_file.close()
+                        os.unlink(temp_path)
+                        raise
 
-                return self._process_pdf_file(temp_path, silent_errors=silent_errors)
+                try:
+                    return self._process_pdf_file(temp_path, silent_errors=silent_errors, page_range=page_range, workers=pdf_workers)
+                finally:
+                    try:
+                        os.unlink(temp_path)
+                    except OSError:
+                        logger.warning("Failed to remove temporary file %s", temp_path)
             elif "text/plain" in content_type:
                 return response.text
             else:
                 if silent_errors:
+                    record_error("file_loader")
                     return {}
                 raise ValueError(f"Unsupported content type: {content_type}")
         except Exception as e:
             if silent_errors:
+                record_error("file_loader")
                 return {}
             raise ValueError(f"Failed to load data from URL: {e}")
         
-    def _process_pdf_file(self, file_path, silent_errors):
+    def _process_pdf_file(self, file_path, silent_errors, page_range="", workers=0):
         """
-        Process a PDF file and extract its text content.
+        Process a PDF file and extract the text of the selected pages,
+        in parallel across worker processes for large documents.
         """
         try:
-            pdf_text = []
-            with open(file_path, "rb") as file:
-                reader = PdfReader(file)
-                for page in reader.pages:
-                    pdf_text.append(page.extract_text())
-
-            print(pdf_text)
-            response = "\n".join(pdf_text)
+            response = "\n".join(text for _, text in iter_pdf_pages(file_path, page_range, workers))
             return (response, )
         except Exception as e:
             if silent_errors:
+                record_error("file_loader")
                 return {}
             raise ValueError(f"Failed to process PDF file: {e}")
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Page-parallel PDF text extraction.
+
+PyPDF2 extracts text in pure Python, so one large document keeps a single
+core busy for a long time. `iter_pdf_pages` splits the selected pages into
+contiguous spans and extracts them in worker processes, each opening the
+file itself, and yields pages in order as soon as they are ready. Only a
+bounded number of spans are in flight, so memory does not grow with the
+document. Small documents are extracted in-process, page by page, where
+starting workers would cost more than it saves.
+
+Each worker runs `pdf_worker.py` as a fresh interpreter. It imports only
+PyPDF2, so unlike a multiprocessing pool it neither forks the
+multi-threaded ComfyUI process nor re-runs ComfyUI's `main.py` and this
+package's `__init__` in the child. If a worker fails, the rest of the
+document is extracted in-process.
+"""
+
+import os
+import sys
+import json
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple
+
+from .pdf_worker import iter_page_texts
+
+logger = logging.getLogger(__name__)
+
+# Worker processes per document unless the node asks for more
+PDF_WORKERS = int(os.environ.get("FLOWSCALE_PDF_WORKERS", "2"))
+
+# Documents with fewer selected pages than this are extracted in-process
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("FLOWSCALE_PDF_PARALLEL_MIN_PAGES", "16"))
+
+# Spans per worker: more spans balance uneven pages, fewer re-parse the file less
+SPANS_PER_WORKER = 4
+MIN_SPAN_PAGES = 4
+
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_worker.py")
+
+
+def default_workers() -> int:
+    """
+    FLOWSCALE_PDF_WORKERS, 2 if unset.
+    """
+    return max(1, PDF_WORKERS)
+
+
+def parse_page_range(spec: str, page_count: int) -> List[int]:
+    """
+    Turns a 1-based page selection such as "1-5, 8, 12-" into sorted,
+    de-duplicated 0-based page indices. An empty spec selects every page;
+    pages past the end are ignored. Raises ValueError on malformed input.
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return list(range(page_count))
+    selected = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start_text, dash, end_text = part.partition("-")
+        try:
+            start = int(start_text) if start_text.strip() else 1
+            # An open range that starts past the end selects nothing
+            end = (int(end_text) if end_text.strip() else max(page_count, start)) if dash else start
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}")
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid page range: {part!r}")
+        selected.update(range(start - 1, min(end, page_count)))
+    return sorted(selected)
+
+
+def count_pdf_pages(file_path) -> int:
+    from PyPDF2 import PdfReader
+
+    with open(file_path, "rb") as file:
+        return len(PdfReader(file).pages)
+
+
+def _extract_pages(file_path, page_indices: List[int]) -> List[str]:
+    """
+    Extracts the given pages in a worker process.
+    """
+    result = subprocess.run(
+        [sys.executable, _WORKER_SCRIPT, file_path, ",".join(map(str, page_indices))],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        check=True,
+    )
+    texts = json.loads(result.stdout)
+    if len(texts) != len(page_indices):
+        raise ValueError(f"PDF worker returned {len(texts)} pages, expected {len(page_indices)}")
+    return texts
+
+
+def _spans(page_indices: List[int], workers: int) -> List[List[int]]:
+    span_pages = max(MIN_SPAN_PAGES, -(-len(page_indices) // (workers * SPANS_PER_WORKER)))
+    return [page_indices[start:start + span_pages] for start in range(0, len(page_indices), span_pages)]
+
+
+def iter_pdf_pages(file_path, page_range: str = "", workers: int = 0) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, text) for the selected pages, 1-based and in
+    document order. `workers` of 0 uses `default_workers()`.
+    """
+    file_path = str(file_path)
+    page_indices = parse_page_range(page_range, count_pdf_pages(file_path))
+    workers = workers if workers > 0 else default_workers()
+
+    if workers == 1 or len(page_indices) < PDF_PARALLEL_MIN_PAGES:
+        for page_index, text in zip(page_indices, iter_page_texts(file_path, page_indices)):
+            yield page_index + 1, text
+        return
+
+    spans = _spans(page_indices, workers)
+    next_span = 0
+    remaining = []
+    pending = []
+    # Threads only wait on the worker processes and drain their output
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(spans)), thread_name_prefix="pdf-extract")
+    try:
+        while next_span < len(spans) or pending:
+            # Keep every worker busy with one span queued behind it
+            while next_span < len(spans) and len(pending) < workers * 2:
+                span = spans[next_span]
+                pending.append((span, pool.submit(_extract_pages, file_path, span)))
+                next_span += 1
+            span, future = pending.pop(0)
+            try:
+                texts = future.result()
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                stderr = getattr(e, "stderr", None) or b""
+                logger.warning(
+                    "PDF worker failed; extracting the remaining pages in-process: %s %s",
+                    e, stderr.decode("utf-8", "replace")[-500:],
+                )
+                remaining = span + [index for later, _ in pending for index in later] + \
+                    [index for later in spans[next_span:] for index in later]
+                break
+            for page_index, text in zip(span, texts):
+                yield page_index + 1, text
+    finally:
+        # Stopped early (or failed): drop the spans nobody will read
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    for page_index, text in zip(remaining, iter_page_texts(file_path, remaining)):
+        yield page_index + 1, text
@@ -0,0 +1,32 @@
+"""
+Standalone PDF page extractor, run as a script by `pdf_extract`.
+
+It imports nothing but PyPDF2, so a worker starts without loading ComfyUI,
+torch or this package. Keep it free of package-relative imports.
+
+    python pdf_worker.py FILE PAGE_INDEX[,PAGE_INDEX...]
+
+Writes the text of the given 0-based pages to stdout as a JSON list.
+"""
+
+import sys
+import json
+
+
+def iter_page_texts(file_path, page_indices):
+    from PyPDF2 import PdfReader
+
+    with open(file_path, "rb") as file:
+        reader = PdfReader(file)
+        for index in page_indices:
+            yield reader.pages[index].extract_text() or ""
+
+
+def main(argv):
+    file_path, indices = argv
+    page_indices = [int(index) for index in indices.split(",") if index]
+    json.dump(list(iter_page_texts(file_path, page_indices)), sys.stdout)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
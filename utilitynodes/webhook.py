@@ -1,7 +1,6 @@
 import requests
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class WebhookSender: